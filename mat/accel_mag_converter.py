@@ -0,0 +1,20 @@
+import numpy as np
+
+
+class AccelMagConverter:
+    """
+    Convert accelerometer and magnetometer data together, as one
+    (6, n) array with the accelerometer channels first, into one
+    preallocated output. Raw data already cast to a float type is
+    converted in that type, integer counts in double precision.
+    """
+    def __init__(self, accelerometer, magnetometer):
+        self.accelerometer = accelerometer
+        self.magnetometer = magnetometer
+
+    def convert(self, raw_meter, temperature=None):
+        dtype = raw_meter.dtype if raw_meter.dtype.kind == 'f' else float
+        out = np.empty(raw_meter.shape, dtype)
+        self.accelerometer.convert_into(raw_meter[:3], out[:3])
+        self.magnetometer.convert_into(raw_meter[3:], out[3:], temperature)
+        return out
@@ -9,15 +9,17 @@ class BinaryCodedDecimal(Meter):
     e.g. 0x2677 converts to 26.77
     """
     def __init__(self, hs=None):
-        self._convert_fcn = np.vectorize(self._dec_to_bcd)
+        pass
 
     def convert(self, raw_meter, temperature=None):
-        return self._convert_fcn(raw_meter)
-
-    def _dec_to_bcd(self, value):
-        output = 0
+        """
+        Decode each 4 bit digit of every value at once, adding the digits
+        in the same order as a digit by digit loop would
+        """
+        raw_meter = np.asarray(raw_meter)
+        output = np.zeros(raw_meter.shape)
         for i in range(4):
             shift = 12 - 4*i
             multiplier = 10 / (10**i)
-            output += (value >> shift & 15) * multiplier
+            output += (raw_meter >> shift & 15) * multiplier
         return output
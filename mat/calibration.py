@@ -49,6 +49,16 @@ class Calibration(ABC):
             coefficients[tag] = value
         return cls(coefficients)
 
+    @classmethod
+    def from_coefficients(cls, coefficients):
+        """
+        Create a calibration from coefficients that are already numeric, eg.
+        the coefficients attribute of another calibration object
+        """
+        calibration = cls.__new__(cls)
+        calibration.coefficients = dict(coefficients)
+        return calibration
+
     @staticmethod
     @abstractmethod
     def _parse_tag_value_pairs(calibration_string):
@@ -78,6 +78,15 @@ def calibration_from_string(calibration_string):
         return V2Calibration(DEFAULT_COEFFICIENTS)
 
 
+def calibration_from_coefficients(coefficients):
+    """
+    Recreate a calibration object from the numeric coefficients of an
+    existing one, eg. after they have been saved to json
+    """
+    klass = {2: V2Calibration, 3: V3Calibration}[int(coefficients['RVN'])]
+    return klass.from_coefficients(coefficients)
+
+
 def _crop_calibration_string(calibration_string):
     start_index = calibration_string.find(CALIBRATION_START_TAG)
     end_index = calibration_string.find(CALIBRATION_END_TAG)
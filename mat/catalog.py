@@ -0,0 +1,218 @@
+# GPLv3 License
+# Copyright (c) 2018 Lowell Instruments, LLC, some rights reserved
+
+"""
+Catalog of the .lid files in a directory tree
+
+Each file's header and page index is read in a process pool and summarised
+as one row of an SQLite table, so questions like "which loggers recorded
+pressure in June" can be answered without opening the data files again.
+Files that haven't changed since they were catalogued are not re-read.
+
+usage: python -m mat.catalog DIRECTORY [--db DB] [--workers N]
+"""
+
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from mat.data_file_factory import load_data_file
+from mat.header import DEPLOYMENT_NUMBER
+from mat.sensor import major_interval_info
+from mat.sensor_specification import AVAILABLE_SENSORS
+from mat.utils import posix_time
+import os
+import sqlite3
+import sys
+
+
+CATALOG_FILE_NAME = 'catalog.db'
+FILE_EXTENSION = '.lid'
+SERIAL_NUMBER = 'SER'
+SENSOR_TAGS = [spec.enabled_tag for spec in AVAILABLE_SENSORS]
+COLUMNS = ['path',
+           'size',
+           'mtime_ns',
+           'serial',
+           'deployment',
+           'start_time',
+           'end_time',
+           'n_pages',
+           'calibration_version',
+           'header_error',
+           'error'] + SENSOR_TAGS
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER,
+    mtime_ns INTEGER,
+    serial TEXT,
+    deployment INTEGER,
+    start_time INTEGER,
+    end_time INTEGER,
+    n_pages INTEGER,
+    calibration_version INTEGER,
+    header_error TEXT,
+    error TEXT,
+    {}
+)'''.format(',\n    '.join(tag + ' INTEGER' for tag in SENSOR_TAGS))
+
+
+def catalog_directory(directory, db_path=None, workers=None):
+    """
+    Bring the catalog at db_path (default DIRECTORY/catalog.db) up to date
+    with the .lid files under directory. Rows for files that have been
+    removed are deleted. Returns the number of files that were read.
+    """
+    db_path = db_path or os.path.join(directory, CATALOG_FILE_NAME)
+    paths = find_data_files(directory)
+    with _connect(db_path) as connection:
+        catalogued = {row[0]: (row[1], row[2]) for row in connection.execute(
+            'SELECT path, size, mtime_ns FROM files')}
+        changed = [path for path in paths
+                   if catalogued.get(path) != _file_stat(path)]
+        removed = set(catalogued) - set(paths)
+        connection.executemany('DELETE FROM files WHERE path = ?',
+                               [(path,) for path in removed])
+        for entry in _map(catalog_entry, changed, workers):
+            connection.execute(
+                'INSERT OR REPLACE INTO files ({}) VALUES ({})'.format(
+                    ', '.join(COLUMNS), ', '.join('?' * len(COLUMNS))),
+                [entry[column] for column in COLUMNS])
+    return len(changed)
+
+
+def find_data_files(directory):
+    paths = []
+    for root, _, file_names in os.walk(directory):
+        for file_name in file_names:
+            if file_name.lower().endswith(FILE_EXTENSION):
+                paths.append(os.path.abspath(os.path.join(root, file_name)))
+    return sorted(paths)
+
+
+def catalog_entry(path):
+    """
+    Summary of one data file as a dictionary with COLUMNS as keys. A file
+    that can't be read gets an entry with the reason in 'error'.
+    """
+    entry = dict.fromkeys(COLUMNS)
+    entry['path'] = path
+    entry['size'], entry['mtime_ns'] = _file_stat(path)
+    try:
+        data_file = load_data_file(path)
+    except Exception as error:
+        entry['error'] = str(error) or type(error).__name__
+        return entry
+    try:
+        _read_entry(data_file, entry)
+    except Exception as error:
+        entry['error'] = str(error) or type(error).__name__
+    finally:
+        data_file.close()
+    return entry
+
+
+def _read_entry(data_file, entry):
+    header = data_file.header()
+    entry['serial'] = header.tag(SERIAL_NUMBER)
+    entry['deployment'] = header.tag(DEPLOYMENT_NUMBER)
+    for tag in SENSOR_TAGS:
+        entry[tag] = int(bool(header.tag(tag)))
+    entry['n_pages'] = data_file.n_pages()
+    if data_file.header_error:
+        entry['header_error'] = '{}/{}'.format(*data_file.header_error)
+    page_times = data_file.page_times()
+    entry['start_time'] = int(page_times[0])
+    entry['end_time'] = int(page_times[-1])
+    # the last page ends after its last complete major interval
+    major_interval, interval_bytes = major_interval_info(header)
+    if interval_bytes:
+        last_page_bytes = int(data_file.page_lengths()[-1]) * 2
+        entry['end_time'] += (last_page_bytes // interval_bytes
+                              * major_interval)
+    version = data_file.calibration().coefficients.get('RVN')
+    if version is not None:
+        entry['calibration_version'] = int(float(version))
+
+
+def query(db_path, sensor=None, start=None, end=None, serial=None):
+    """
+    Return the catalogued files, as dictionaries, that have sensor enabled
+    (one of SENSOR_TAGS) and data between start and end. start and end are
+    datetimes or posix seconds.
+    """
+    conditions = ['error IS NULL']
+    values = []
+    if sensor is not None:
+        if sensor not in SENSOR_TAGS:
+            raise ValueError('Unknown sensor: {}'.format(sensor))
+        conditions.append('{} = 1'.format(sensor))
+    if start is not None:
+        conditions.append('end_time >= ?')
+        values.append(posix_time(start))
+    if end is not None:
+        conditions.append('start_time < ?')
+        values.append(posix_time(end))
+    if serial is not None:
+        conditions.append('serial = ?')
+        values.append(str(serial))
+    sql = 'SELECT {} FROM files WHERE {} ORDER BY path'.format(
+        ', '.join(COLUMNS), ' AND '.join(conditions))
+    with _connect(db_path) as connection:
+        return [dict(zip(COLUMNS, row))
+                for row in connection.execute(sql, values)]
+
+
+def _connect(db_path):
+    connection = sqlite3.connect(db_path)
+    columns = [row[1] for row in
+               connection.execute('PRAGMA table_info(files)')]
+    if columns and columns != COLUMNS:
+        # catalogued with other sensors, the files have to be read again
+        connection.execute('DROP TABLE files')
+    connection.execute(SCHEMA)
+    return _Connection(connection)
+
+
+class _Connection:
+    """ Commit on success and always close, unlike sqlite3's own context """
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        return self.connection.__enter__()
+
+    def __exit__(self, *exc_info):
+        try:
+            return self.connection.__exit__(*exc_info)
+        finally:
+            self.connection.close()
+
+
+def _file_stat(path):
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _map(function, items, workers):
+    if workers == 1 or len(items) <= 1:
+        return map(function, items)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(function, items, chunksize=16))
+
+
+def main(args=None):
+    parser = ArgumentParser(description='Catalog the .lid files in a '
+                                        'directory tree')
+    parser.add_argument('directory')
+    parser.add_argument('--db', help='catalog file (default: '
+                                     'DIRECTORY/{})'.format(CATALOG_FILE_NAME))
+    parser.add_argument('--workers', type=int, default=None,
+                        help='number of processes (default: one per CPU)')
+    args = parser.parse_args(args)
+    n_read = catalog_directory(args.directory, args.db, args.workers)
+    sys.stdout.write('{} file(s) catalogued\n'.format(n_read))
+    return n_read
+
+
+if __name__ == '__main__':
+    main()
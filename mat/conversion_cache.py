@@ -0,0 +1,32 @@
+class ConversionCache:
+    """
+    Converted sensor data for the page being processed. One cache is shared
+    by all the sensors of a conversion, so each sensor is gathered and
+    converted once per page however many data products, or temperature
+    dependant sensors, use it. Entries are dropped as soon as a different
+    page is seen, and DataConverter clears the cache before each page.
+    """
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._page_key = None
+        self._entries = {}
+
+    def get(self, page_key, key, convert):
+        """
+        Return the data stored under key for the page identified by
+        page_key, calling convert() to make it if it isn't cached
+        """
+        if page_key != self._page_key:
+            self.clear()
+            self._page_key = page_key
+        if key in self._entries:
+            self.hits += 1
+        else:
+            self.misses += 1
+            self._entries[key] = convert()
+        return self._entries[key]
+
+    def clear(self):
+        self._page_key = None
+        self._entries = {}
@@ -26,3 +26,11 @@ class CubicAccelerometer(Meter):
         return (dot(self.gain, raw_accelerometer) +
                 self.offset +
                 self.cubic * raw_accelerometer ** 3)
+
+    def convert_into(self, raw_meter, out, temperature=None):
+        raw_accelerometer = raw_meter / 1024.
+        dot(self.gain, raw_accelerometer, out=out)
+        out += self.offset
+        raw_accelerometer **= 3
+        raw_accelerometer *= self.cubic
+        out += raw_accelerometer
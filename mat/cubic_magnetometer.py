@@ -24,3 +24,6 @@ class CubicMagnetometer(Meter):
 
     def convert(self, raw_magnetometer, temperature=None):
         return dot(self.soft_iron, raw_magnetometer + self.hard_iron)
+
+    def convert_into(self, raw_magnetometer, out, temperature=None):
+        dot(self.soft_iron, raw_magnetometer + self.hard_iron, out=out)
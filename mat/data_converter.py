@@ -1,7 +1,22 @@
+from mat.conversion_cache import ConversionCache
 from mat.data_file_factory import load_data_file
 from mat.data_product import data_product_factory
-from mat.sensor import create_sensors, major_interval_info
+from mat.sensor import (
+    DTYPES,
+    create_sensors,
+    major_interval_info,
+    select_sensors,
+    use_dtype,
+    use_jit,
+    use_lookup_tables,
+)
+from mat.sensor_data_file import NoDataError
+from mat.page_prefetcher import PagePrefetcher
 from math import floor
+from time import monotonic, sleep
+
+
+FOLLOW_POLL_SECONDS = 0.5
 
 
 def default_parameters():
@@ -19,21 +34,45 @@ def default_parameters():
             'declination': 0,
             'split': None,
             'calibration': None,
-            'overwrite': True}
+            'overwrite': True,
+            'backend': 'file',
+            'index_cache': False,
+            'prefetch': 0,
+            'time_range': None,
+            'follow': False,
+            'follow_timeout': 10,
+            'batch_pages': 1,
+            'sensors': None,
+            'lookup_tables': False,
+            'jit': False,
+            'dtype': 'float64'}
 
 
 class DataConverter:
-    def __init__(self, path, parameters):
+    def __init__(self, path, parameters, buffer=None):
+        """
+        To convert a file that is already in memory, pass its contents as
+        buffer (bytes, bytearray, memoryview or BytesIO). path is then only
+        used for the file type and to name the output files.
+        """
         self.path = path
         self.parameters = parameters
+        self.buffer = buffer
         self.source_file = None
+        self.conversion_cache = ConversionCache()
         self.observers = []
         self._is_running = None
+        _check_parameters(parameters)
 
     def _load_source_file(self):
         if not self.source_file:
-            self.source_file = load_data_file(self.path,
-                                              self.parameters['calibration'])
+            source = self.path if self.buffer is None else self.buffer
+            self.source_file = load_data_file(
+                source,
+                self.parameters['calibration'],
+                self.parameters['backend'],
+                self.parameters['index_cache'],
+                file_type=self.path[-4:])
         return self.source_file
 
     def cancel_conversion(self):
@@ -41,19 +80,139 @@ class DataConverter:
 
     def convert(self):
         self._is_running = True
-        self._load_source_file()
+        if self.parameters['follow']:
+            self._wait_for_source_file()
+        else:
+            self._load_source_file()
         outputs = data_product_factory(self.path,
                                        self._build_sensors(),
                                        self.parameters)
+        if self.parameters['follow']:
+            self._follow(outputs)
+            return
 
         page_times = self.source_file.page_times()
-        for i in range(self.source_file.n_pages()):
+        page_numbers = self._page_numbers()
+        n_converted = 0
+        for pages, data in self._load(self._blocks(page_numbers)):
             if not self._is_running:
                 break  # pragma: no cover
+            if len(pages) == 1:
+                self._write_to_outputs(outputs, data, page_times[pages[0]])
+            else:
+                self._write_block_to_outputs(outputs,
+                                             data,
+                                             page_times[pages[0]:pages[-1]+1])
+            n_converted += len(pages)
+            percent = n_converted / len(page_numbers) * 100
+            self._update_observers(percent)
+
+    def _wait_for_source_file(self):
+        """
+        A file that is still being written may not have a complete header or
+        first page yet
+        """
+        give_up = monotonic() + self.parameters['follow_timeout']
+        while True:
+            try:
+                return self._load_source_file()
+            except (NoDataError, ValueError):
+                if monotonic() > give_up or not self._is_running:
+                    raise
+                sleep(FOLLOW_POLL_SECONDS)
+
+    def _follow(self, outputs):
+        """
+        Convert pages as they are added to a file that is still being
+        written. A page is converted once it is full or the next page has
+        started. An incomplete last page is converted once the file hasn't
+        grown for 'follow_timeout' seconds.
+        """
+        n_converted = 0
+        last_growth = monotonic()
+        while self._is_running:
+            file_size = self.source_file.file_size()
+            n_pages = self.source_file.refresh()
+            if self.source_file.file_size() != file_size:
+                last_growth = monotonic()
+            elif monotonic() - last_growth > self.parameters['follow_timeout']:
+                break
+            n_converted = self._convert_pages(outputs,
+                                              n_converted,
+                                              self._complete_pages(n_pages))
+            sleep(FOLLOW_POLL_SECONDS)
+        if self._is_running:
+            self._convert_pages(outputs,
+                                n_converted,
+                                self.source_file.n_pages())
+
+    def _complete_pages(self, n_pages):
+        """ The number of pages that won't grow any more """
+        full_length = (self.source_file.PAGE_SIZE
+                       - self.source_file.mini_header_length()) // 2
+        if n_pages and self.source_file.page_lengths()[-1] == full_length:
+            return n_pages
+        return n_pages - 1
+
+    def _convert_pages(self, outputs, start, stop):
+        page_times = self.source_file.page_times()
+        page_numbers = self._page_numbers()
+        for i in range(start, stop):
+            if not self._is_running:
+                return i  # pragma: no cover
+            if i not in page_numbers:
+                continue
             page = self.source_file.page(i)
             self._write_to_outputs(outputs, page, page_times[i])
             percent = (i + 1) / self.source_file.n_pages() * 100
             self._update_observers(percent)
+        return max(start, stop)
+
+    def _page_numbers(self):
+        """
+        All pages, or only the pages overlapping the 'time_range' parameter.
+        Samples outside the time range are removed by the output stream.
+        """
+        time_range = self.parameters['time_range']
+        if time_range:
+            return self.source_file.pages_between(*time_range)
+        return range(self.source_file.n_pages())
+
+    def _blocks(self, page_numbers):
+        """
+        Group page_numbers into runs of up to 'batch_pages' pages of the same
+        length. Batching is turned off when the output is split, as 'split'
+        counts the pages written to each file.
+        """
+        batch_pages = 1 if self.parameters['split'] else \
+            self.parameters['batch_pages']
+        page_lengths = self.source_file.page_lengths()
+        block = []
+        for i in page_numbers:
+            if block and (len(block) == batch_pages
+                          or page_lengths[i] != page_lengths[block[0]]):
+                yield block
+                block = []
+            block.append(i)
+        if block:
+            yield block
+
+    def _load(self, blocks):
+        """
+        Yield (page numbers, data) for each block. Single pages are loaded
+        with page() and longer blocks with pages(). If the 'prefetch'
+        parameter is set, that many blocks are read ahead in a background
+        thread.
+        """
+        depth = self.parameters['prefetch']
+        if depth:
+            return iter(PagePrefetcher(self._load_block, blocks, depth))
+        return ((pages, self._load_block(pages)) for pages in blocks)
+
+    def _load_block(self, pages):
+        if len(pages) == 1:
+            return self.source_file.page(pages[0])
+        return self.source_file.pages(pages[0], pages[-1] + 1)
 
     def _build_sensors(self):
         header = self.source_file.header()
@@ -64,14 +223,30 @@ class DataConverter:
             seconds = floor((self.source_file.PAGE_SIZE
                              - self.source_file.mini_header_length())
                             / bytes) * major_interval
-        return create_sensors(header,
-                              self.source_file.calibration(),
-                              seconds)
+        sensors = create_sensors(header,
+                                 self.source_file.calibration(),
+                                 seconds,
+                                 self.conversion_cache)
+        if self.parameters['lookup_tables']:
+            use_lookup_tables(sensors)
+        if self.parameters['jit']:
+            use_jit(sensors)
+        if self.parameters['dtype'] != 'float64':
+            use_dtype(sensors, self.parameters['dtype'])
+        # the page layout depends on all the sensors, so only the output
+        # is restricted to the 'sensors' parameter
+        return select_sensors(sensors, self.parameters['sensors'])
 
     def _write_to_outputs(self, outputs, page, page_time):
+        self.conversion_cache.clear()
         for this_output in outputs:
             this_output.process_page(page, page_time)
 
+    def _write_block_to_outputs(self, outputs, block, page_times):
+        self.conversion_cache.clear()
+        for this_output in outputs:
+            this_output.process_block(block, page_times)
+
     def _update_observers(self, percent):
         for observer in self.observers:
             observer(percent_done=percent)
@@ -85,3 +260,13 @@ class DataConverter:
 
     def __del__(self):
         self.close_source()
+
+
+def _check_parameters(parameters):
+    if parameters['dtype'] not in DTYPES:
+        raise ValueError('Unknown dtype: {}'.format(parameters['dtype']))
+    if parameters['follow'] and (parameters['batch_pages'] > 1
+                                 or parameters['prefetch']):
+        # pages are converted one by one as they are written
+        raise ValueError("'follow' can't be combined with 'batch_pages' "
+                         "or 'prefetch'")
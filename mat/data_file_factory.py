@@ -1,14 +1,38 @@
 from mat.lid_data_file import LidDataFile
+from mat.sensor_data_file import DEFAULT_PAGE_CACHE_BYTES, BUFFER_TYPES
 
 
 DATA_FILE_TYPES = {'.lid': LidDataFile}
 
 
-def load_data_file(file_path, calibration=None):
-    extension = file_path[-4:]
+def load_data_file(file_path,
+                   calibration=None,
+                   backend='file',
+                   index_cache=False,
+                   page_cache_bytes=DEFAULT_PAGE_CACHE_BYTES,
+                   file_type=None):
+    """
+    file_path can also be a bytes, bytearray, memoryview or BytesIO holding
+    the whole file, in which case file_type (eg. '.lid') must be given.
+    backend selects how data pages are read. 'file' reads each page into a
+    new array, 'mmap' returns read-only views into a memory map of the file.
+    With index_cache, the header, calibration and page index are saved next
+    to the data file and reused the next time it is opened.
+    page_cache_bytes is the memory budget for recently used pages.
+    """
+    if isinstance(file_path, BUFFER_TYPES) and not file_type:
+        raise WrongFileTypeError('file_type is required for buffers')
+    if file_type:
+        extension = file_type if file_type.startswith('.') else '.' + file_type
+    else:
+        extension = file_path[-4:]
     try:
         klass = DATA_FILE_TYPES.get(extension)
-        return klass(file_path, calibration)
+        return klass(file_path,
+                     calibration,
+                     backend,
+                     index_cache,
+                     page_cache_bytes)
     except TypeError:
         raise WrongFileTypeError('Invalid Filename or extension')
 
@@ -1,7 +1,9 @@
 import numpy as np
 from mat.output_stream import output_stream_factory
 from abc import ABC, abstractmethod
+from mat import jit
 from mat.utils import roll_pitch_yaw, apply_declination
+from mat.sensor import accel_mag_pair
 from collections import namedtuple
 
 
@@ -54,6 +56,8 @@ def _remaining_sensors(sensors, data_products):
 class DataProduct(ABC):
     OUTPUT_TYPE = ''
     REQUIRED_SENSORS = []
+    # convert the accelerometer and magnetometer together, see AccelMagPair
+    FUSE_ACCEL_MAG = False
 
     def __init__(self, sensors, parameters, output_stream):
         self.sensors = self._get_required_sensors(sensors)
@@ -62,6 +66,12 @@ class DataProduct(ABC):
         self.average = parameters['average']
         self.split = parameters['split']
         self.declination = self.parameters['declination']
+        self.roll_pitch_yaw = roll_pitch_yaw
+        if parameters['jit'] and jit.available():
+            self.roll_pitch_yaw = jit.roll_pitch_yaw
+        self.accel_mag = None
+        if self.FUSE_ACCEL_MAG:
+            self.accel_mag = accel_mag_pair(self.sensors)
         self.configure_output_stream()
 
     def _get_required_sensors(self, sensors):
@@ -77,12 +87,40 @@ class DataProduct(ABC):
         self.output_stream.set_column_header(name, self.column_header())
 
     def convert_sensors(self, data_page, page_time):
+        if self.accel_mag:
+            return self._split_accel_mag(self.accel_mag.convert(data_page,
+                                                                self.average,
+                                                                page_time))
         converted = []
         for sensor in self.sensors:
             data, time = sensor.convert(data_page, self.average, page_time)
             converted.append(SensorDataTime(data, time))
         return converted
 
+    def convert_sensors_block(self, block, page_times):
+        if self.accel_mag:
+            return self._split_accel_mag(
+                self.accel_mag.convert_block(block, self.average, page_times))
+        converted = []
+        for sensor in self.sensors:
+            data, time = sensor.convert_block(block, self.average, page_times)
+            converted.append(SensorDataTime(data, time))
+        return converted
+
+    @staticmethod
+    def _split_accel_mag(converted):
+        data, time = converted
+        return [SensorDataTime(data[:3], time), SensorDataTime(data[3:], time)]
+
+    def process_page(self, data_page, page_time):
+        self.write_converted(self.convert_sensors(data_page, page_time))
+
+    def process_block(self, block, page_times):
+        """
+        Process a 2-d block of equal length pages, see SensorDataFile.pages()
+        """
+        self.write_converted(self.convert_sensors_block(block, page_times))
+
     @abstractmethod
     def stream_name(self):
         pass  # pragma: no cover
@@ -96,7 +134,7 @@ class DataProduct(ABC):
         pass  # pragma: no cover
 
     @abstractmethod
-    def process_page(self, data_page, page_time):
+    def write_converted(self, converted):
         pass  # pragma: no cover
 
 
@@ -119,8 +157,7 @@ class DiscreteChannel(DataProduct):
     def column_header(self):
         return self.sensors[0].sensor_spec.header
 
-    def process_page(self, data_page, page_time):
-        converted = self.convert_sensors(data_page, page_time)
+    def write_converted(self, converted):
         self.output_stream.write(self.sensors[0].name,
                                  converted[0].data,
                                  converted[0].time)
@@ -129,6 +166,7 @@ class DiscreteChannel(DataProduct):
 class Current(DataProduct):
     OUTPUT_TYPE = 'current'
     REQUIRED_SENSORS = ['Accelerometer', 'Magnetometer']
+    FUSE_ACCEL_MAG = True
 
     def __init__(self, sensors, parameters, output_stream):
         super().__init__(sensors, parameters, output_stream)
@@ -147,7 +185,7 @@ class Current(DataProduct):
                 'Velocity-E (cm/s)')
 
     def _calc_tilt_and_heading(self, accel, mag):
-        roll, pitch, yaw = roll_pitch_yaw(accel, mag)
+        roll, pitch, yaw = self.roll_pitch_yaw(accel, mag)
         x = -np.cos(roll) * np.sin(pitch)
         y = np.sin(roll)
 
@@ -160,12 +198,12 @@ class Current(DataProduct):
         heading = np.mod(heading + np.deg2rad(self.declination), 2 * np.pi)
         return tilt, heading
 
-    def process_page(self, data_page, page_time):
-        converted = self.convert_sensors(data_page, page_time)
+    def write_converted(self, converted):
         accel = converted[0].data
         mag = converted[1].data
         tilt, heading = self._calc_tilt_and_heading(accel, mag)
         speed = self.tilt_curve.speed_from_tilt(np.degrees(tilt))
+        speed = speed.astype(tilt.dtype, copy=False)
 
         velocity_n = speed * np.cos(heading)
         velocity_e = speed * np.sin(heading)
@@ -178,6 +216,7 @@ class Current(DataProduct):
 class Compass(DataProduct):
     OUTPUT_TYPE = 'compass'
     REQUIRED_SENSORS = ['Accelerometer', 'Magnetometer']
+    FUSE_ACCEL_MAG = True
 
     def stream_name(self):
         return 'Heading'
@@ -188,14 +227,13 @@ class Compass(DataProduct):
     def column_header(self):
         return 'Heading (degrees)'
 
-    def process_page(self, data_page, page_time):
-        converted = self.convert_sensors(data_page, page_time)
+    def write_converted(self, converted):
         accel = converted[0].data
         mag = converted[1].data
-        m = np.array([[0, 0, 1], [0, -1, 0], [1, 0, 0]])
+        m = np.array([[0, 0, 1], [0, -1, 0], [1, 0, 0]], dtype=accel.dtype)
         accel = np.dot(m, accel)
         mag = np.dot(m, mag)
-        roll, pitch, heading = roll_pitch_yaw(accel, mag)
+        roll, pitch, heading = self.roll_pitch_yaw(accel, mag)
         heading = apply_declination(np.degrees(heading), self.declination)
         heading = np.mod(heading, 360)
         heading = np.reshape(heading, (1, -1))
@@ -207,6 +245,7 @@ class Compass(DataProduct):
 class YawPitchRoll(DataProduct):
     OUTPUT_TYPE = 'ypr'
     REQUIRED_SENSORS = ['Accelerometer', 'Magnetometer']
+    FUSE_ACCEL_MAG = True
 
     def stream_name(self):
         return 'YawPitchRoll'
@@ -217,11 +256,10 @@ class YawPitchRoll(DataProduct):
     def column_header(self):
         return 'Yaw (degrees),Pitch (degrees),Roll (degrees)'
 
-    def process_page(self, data_page, page_time):
-        converted = self.convert_sensors(data_page, page_time)
+    def write_converted(self, converted):
         accel = converted[0].data
         mag = converted[1].data
-        roll, pitch, yaw = roll_pitch_yaw(accel, mag)
+        roll, pitch, yaw = self.roll_pitch_yaw(accel, mag)
         yaw = apply_declination(np.degrees(yaw), self.declination)
         yaw = np.reshape(yaw, (1, -1))
         data = np.vstack((yaw, np.degrees(pitch), np.degrees(roll)))
@@ -241,8 +279,7 @@ class Cable(DataProduct):
     def column_header(self):
         return 'Rotation From Level (degrees),Axial Rotation (degrees)'
 
-    def process_page(self, data_page, page_time):
-        converted = self.convert_sensors(data_page, page_time)
+    def write_converted(self, converted):
         accel = converted[0].data
         axial = np.arctan2(-accel[0, :], accel[1, :])
         pitch = np.arctan2(
@@ -262,13 +299,23 @@ class CompoundProduct(DataProduct):
         fields = [getattr(x.sensor_spec, field) for x in self.sensors]
         return ','.join(fields)
 
-    def process_page(self, data_page, page_time):
-        converted = self.convert_sensors(data_page, page_time)
-        shortest = min([np.size(x.data) for x in converted])
-        data = np.vstack([x.data[:, :shortest] for x in converted])
-        self.output_stream.write(self.stream_name(),
-                                 data,
-                                 converted[0].time[:shortest])
+    def process_block(self, block, page_times):
+        self.write_converted(self.convert_sensors_block(block, page_times),
+                             len(block))
+
+    def write_converted(self, converted, n_pages=1):
+        """
+        Stack the sensors' samples page by page, each page cut to the
+        sensor with the fewest samples in that page. A page can end in the
+        middle of a record, so the counts can differ from sensor to sensor.
+        """
+        shortest = min([x.data.shape[1] for x in converted]) // n_pages
+        data = np.vstack([_page_heads(x.data, n_pages, shortest)
+                          for x in converted])
+        time = _page_heads(np.reshape(converted[0].time, (1, -1)),
+                           n_pages,
+                           shortest)
+        self.output_stream.write(self.stream_name(), data, time[0])
 
     def data_format(self):
         return self._join_spec_fields('format')
@@ -290,6 +337,16 @@ class DissolvedOxygen(CompoundProduct):
 class AccelMag(CompoundProduct):
     OUTPUT_TYPE = 'accelmag'
     REQUIRED_SENSORS = ['Accelerometer', 'Magnetometer']
+    FUSE_ACCEL_MAG = True
 
     def stream_name(self):
         return 'AccelMag'
+
+
+def _page_heads(data, n_pages, n_samples):
+    """
+    The first n_samples of each page of 2-d data made of n_pages pages with
+    the same number of samples
+    """
+    pages = np.reshape(data, (data.shape[0], n_pages, -1))
+    return np.reshape(pages[:, :, :n_samples], (data.shape[0], -1))
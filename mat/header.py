@@ -63,9 +63,21 @@ class Header:
         self.header_string = header_string
         self._header = {}
 
+    @classmethod
+    def from_tags(cls, header_string, tags):
+        """
+        Create an already parsed header, eg. from the output of tags()
+        """
+        header = cls(header_string)
+        header._header = dict(tags)
+        return header
+
     def tag(self, tag):
         return self._header.get(tag)
 
+    def tags(self):
+        return dict(self._header)
+
     def parse_header(self):
         header_string = self._crop_header_block(self.header_string)
         self._validate_header_block(header_string)
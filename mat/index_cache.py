@@ -0,0 +1,73 @@
+# GPLv3 License
+# Copyright (c) 2018 Lowell Instruments, LLC, some rights reserved
+
+"""
+Sidecar cache for the values a data file works out when it is opened
+
+The cache is stored as json next to the data file (eg. file.lid.idx). It is
+keyed by the data file's size, modification time and a fingerprint of its
+first and last bytes, so a cache belonging to an older version of the file
+is ignored and rewritten.
+"""
+
+import hashlib
+import json
+import os
+
+
+INDEX_SUFFIX = '.idx'
+INDEX_VERSION = 1
+FINGERPRINT_BYTES = 65536
+
+
+def index_path(file_path):
+    return file_path + INDEX_SUFFIX
+
+
+def load_index(file_path):
+    """
+    Return the cached values for file_path, or None if there is no cache
+    or it doesn't match the file
+    """
+    try:
+        with open(index_path(file_path), 'r') as fid:
+            index = json.load(fid)
+        if index['version'] != INDEX_VERSION:
+            return None
+        if index['key'] != file_key(file_path):
+            return None
+        return index['values']
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def save_index(file_path, values):
+    index = {'version': INDEX_VERSION,
+             'key': file_key(file_path),
+             'values': values}
+    path = index_path(file_path)
+    temp_path = path + '.tmp'
+    try:
+        with open(temp_path, 'w') as fid:
+            json.dump(index, fid)
+        os.replace(temp_path, path)
+    except OSError:
+        # the cache is only an optimization, eg. the directory is read-only
+        pass
+
+
+def file_key(file_path):
+    stat = os.stat(file_path)
+    return {'size': stat.st_size,
+            'mtime': stat.st_mtime_ns,
+            'fingerprint': _file_digest(file_path, stat.st_size)}
+
+
+def _file_digest(file_path, size):
+    digest = hashlib.sha1()
+    with open(file_path, 'rb') as fid:
+        digest.update(fid.read(FINGERPRINT_BYTES))
+        if size > FINGERPRINT_BYTES:
+            fid.seek(max(FINGERPRINT_BYTES, size - FINGERPRINT_BYTES))
+            digest.update(fid.read(FINGERPRINT_BYTES))
+    return digest.hexdigest()
@@ -0,0 +1,224 @@
+"""
+Compiled versions of the conversion hot loops, used with the 'jit'
+conversion parameter
+
+The kernels are compiled with numba on first use. available() tells
+whether numba is installed. numba is only imported when that is asked,
+so conversions without 'jit' don't pay for the import. Without numba
+nothing here is used and the NumPy code runs as usual. Each kernel makes
+one pass over the samples and writes into its output, instead of making
+a temporary array per operation. Results agree with the NumPy code to
+rounding, not bit for bit.
+"""
+
+from functools import lru_cache
+from math import atan2, cos, log, sin
+import numpy as np
+from mat.cubic_accelerometer import CubicAccelerometer
+from mat.cubic_magnetometer import CubicMagnetometer
+from mat.temp_compensated_magnetometer import (
+    TEMPERATURE_RANGE,
+    TempCompensatedMagnetometer,
+)
+from mat.temperature import MAX_INT16, ZERO_KELVIN, Temperature
+
+
+@lru_cache(maxsize=None)
+def available():
+    try:
+        import numba  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class _Kernel:
+    """ function, compiled by numba the first time it is called """
+    def __init__(self, function):
+        self.function = function
+        self.compiled = None
+
+    def __call__(self, *args):
+        if self.compiled is None:
+            from numba import njit
+            # error_model='numpy' so division by zero gives inf, as in NumPy
+            self.compiled = njit(cache=True,
+                                 nogil=True,
+                                 error_model='numpy')(self.function)
+        return self.compiled(*args)
+
+
+@_Kernel
+def _gather(records, selector, out):
+    for page in range(records.shape[0]):
+        for record in range(records.shape[1]):
+            for i in range(selector.shape[0]):
+                out[page, record, i] = records[page, record, selector[i]]
+
+
+@_Kernel
+def _average_bursts(data, burst_count, out):
+    for channel in range(out.shape[0]):
+        for i in range(out.shape[1]):
+            total = 0.0
+            for j in range(i * burst_count, (i + 1) * burst_count):
+                total += data[channel, j]
+            out[channel, i] = total / burst_count
+
+
+@_Kernel
+def _temperature(raw, tma, tmb, tmc, tmr, out):
+    for i in range(raw.shape[0]):
+        value = float(raw[i])
+        log_resistance = log(value * tmr / (MAX_INT16 - value))
+        out[i] = 1 / (tma + tmb * log_resistance
+                      + tmc * log_resistance ** 3) + ZERO_KELVIN
+
+
+@_Kernel
+def _cubic_accelerometer(raw, gain, offset, cubic, out):
+    for i in range(raw.shape[1]):
+        x = raw[0, i] / 1024.
+        y = raw[1, i] / 1024.
+        z = raw[2, i] / 1024.
+        for axis in range(3):
+            value = raw[axis, i] / 1024.
+            out[axis, i] = (gain[axis, 0] * x
+                            + gain[axis, 1] * y
+                            + gain[axis, 2] * z
+                            + offset[axis]
+                            + cubic[axis] * value ** 3)
+
+
+@_Kernel
+def _magnetometer(raw, soft_iron, hard_iron, out):
+    for i in range(raw.shape[1]):
+        x = raw[0, i] + hard_iron[0]
+        y = raw[1, i] + hard_iron[1]
+        z = raw[2, i] + hard_iron[2]
+        for axis in range(3):
+            out[axis, i] = (soft_iron[axis, 0] * x
+                            + soft_iron[axis, 1] * y
+                            + soft_iron[axis, 2] * z)
+
+
+@_Kernel
+def _compensate(temperature, reference, slope, low, high, out):
+    for i in range(temperature.shape[0]):
+        delta = min(max(temperature[i], low), high) - reference
+        for axis in range(3):
+            out[axis, i] += delta * slope[axis]
+
+
+@_Kernel
+def _roll_pitch_yaw(accel, mag, roll, pitch, yaw):
+    for i in range(accel.shape[1]):
+        roll[i] = atan2(accel[1, i], accel[2, i])
+        sin_roll = sin(roll[i])
+        cos_roll = cos(roll[i])
+        pitch[i] = atan2(-accel[0, i],
+                         accel[1, i] * sin_roll + accel[2, i] * cos_roll)
+        sin_pitch = sin(pitch[i])
+        by = mag[2, i] * sin_roll - mag[1, i] * cos_roll
+        bx = (mag[0, i] * cos(pitch[i]) + mag[1, i] * sin_pitch * sin_roll
+              + mag[2, i] * sin_pitch * cos_roll)
+        yaw[i] = atan2(by, bx)
+
+
+def _float_dtype(values):
+    """
+    The dtype to convert values in: their own if they are already floating
+    point, double precision for integer counts, as in AccelMagConverter
+    """
+    return values.dtype if values.dtype.kind == 'f' else np.dtype(float)
+
+
+def gather(records, selector, out):
+    """ out[...] = records[..., selector] for 3-d records and out """
+    _gather(records, selector, out)
+
+
+def average_bursts(data, burst_count):
+    """ The mean of each burst of burst_count samples in 2-d data """
+    out = np.empty((data.shape[0], data.shape[1] // burst_count),
+                   _float_dtype(data))
+    _average_bursts(data, burst_count, out)
+    return out
+
+
+def roll_pitch_yaw(accel, mag):
+    """ Like mat.utils.roll_pitch_yaw """
+    roll, pitch, yaw = np.empty((3, accel.shape[1]),
+                                np.result_type(accel, mag))
+    _roll_pitch_yaw(accel, mag, roll, pitch, yaw)
+    return roll, pitch, yaw
+
+
+def compiled_converter(converter):
+    """
+    A compiled replacement for converter, or converter itself if there
+    isn't one
+    """
+    # by exact type, a subclass may convert differently
+    compiled = COMPILED_CONVERTERS.get(type(converter))
+    return compiled(converter) if compiled else converter
+
+
+class CompiledTemperature:
+    def __init__(self, converter):
+        self.converter = converter
+
+    def convert(self, raw_temperature):
+        raw = np.asarray(raw_temperature)
+        out = np.empty(raw.shape, _float_dtype(raw))
+        c = self.converter
+        _temperature(raw.ravel(), c.tma, c.tmb, c.tmc, c.tmr, out.ravel())
+        return out
+
+
+class CompiledMeter:
+    def __init__(self, converter):
+        self.converter = converter
+
+    def convert(self, raw_meter, temperature=None):
+        out = np.empty(raw_meter.shape, _float_dtype(raw_meter))
+        self.convert_into(raw_meter, out, temperature)
+        return out
+
+
+class CompiledCubicAccelerometer(CompiledMeter):
+    def convert_into(self, raw_meter, out, temperature=None):
+        c = self.converter
+        _cubic_accelerometer(raw_meter,
+                             c.gain,
+                             np.ravel(c.offset),
+                             np.ravel(c.cubic),
+                             out)
+
+
+class CompiledCubicMagnetometer(CompiledMeter):
+    def convert_into(self, raw_meter, out, temperature=None):
+        c = self.converter
+        _magnetometer(raw_meter, c.soft_iron, np.ravel(c.hard_iron), out)
+
+
+class CompiledTempCompensatedMagnetometer(CompiledCubicMagnetometer):
+    def convert_into(self, raw_meter, out, temperature=None):
+        super().convert_into(raw_meter, out)
+        if temperature is None:
+            return
+        assert temperature.shape == (raw_meter.shape[1],)
+        c = self.converter
+        _compensate(temperature,
+                    float(c.temp_reference[0]),
+                    np.ravel(c.temperature_slope),
+                    *map(float, TEMPERATURE_RANGE),
+                    out)
+
+
+COMPILED_CONVERTERS = {
+    Temperature: CompiledTemperature,
+    CubicAccelerometer: CompiledCubicAccelerometer,
+    CubicMagnetometer: CompiledCubicMagnetometer,
+    TempCompensatedMagnetometer: CompiledTempCompensatedMagnetometer,
+}
@@ -1,10 +1,23 @@
 from mat.sensor_data_file import SensorDataFile
 from math import ceil
-from mat.utils import parse_tags, epoch
-from datetime import datetime
+from mat.utils import parse_tags
+from collections import namedtuple
 import numpy as np
 
 
+MINI_HEADER_START = b'MHS\r\n'
+MINI_HEADER_END = b'MHE\r\n'
+MINI_HEADER_MAX_LENGTH = 1024
+PAGE_SIGNATURE = MINI_HEADER_START + b'CLK '
+SEARCH_CHUNK_SIZE = 4 * 1024 ** 2
+
+
+# offsets and mini_header_lengths are arrays with one entry per page. clocks
+# is a list of the CLK strings from each mini-header.
+PageIndex = namedtuple('PageIndex',
+                       ['offsets', 'mini_header_lengths', 'clocks'])
+
+
 class LidDataFile(SensorDataFile):
     PAGE_SIZE = 1024 ** 2
 
@@ -15,68 +28,224 @@ class LidDataFile(SensorDataFile):
     def n_pages(self):
         if self._n_pages is not None:
             return self._n_pages
-        ideal_n = ceil((self.file_size() - self.data_start) / self.PAGE_SIZE)
-        successful_reads = 0
-        try:
-            for n in range(ideal_n):
-                self._read_mini_header(n)
-                successful_reads += 1
-        except ValueError:
-            self.header_error = (successful_reads, ideal_n)
-        self._n_pages = successful_reads
+        self._n_pages = len(self.page_index().offsets)
         return self._n_pages
 
+    def page_index(self):
+        if self._page_index is None:
+            self._page_index = self._scan_pages()
+        return self._page_index
+
+    def _scan_pages(self, offset=None, n_indexed=0):
+        """
+        Read the mini-headers from offset to the end of the file in one
+        forward pass, stepping from page to page. When a page without a valid
+        mini-header follows a good one, header_error is recorded and scanning
+        resumes at the next valid page found by _resync. n_indexed is the
+        number of pages already indexed before offset.
+        """
+        if offset is None:
+            offset = self.data_start
+        ideal_n = ceil((self.file_size() - self.data_start) / self.PAGE_SIZE)
+        offsets = []
+        mini_header_lengths = []
+        clocks = []
+        while offset is not None and offset < self.file_size():
+            mini_header = self._parse_mini_header(offset)
+            if mini_header is None:
+                if self.header_error is None:
+                    self.header_error = (n_indexed + len(offsets), ideal_n)
+                if n_indexed + len(offsets) == 0:
+                    break
+                offset = self._resync(offset)
+                continue
+            length, tags = mini_header
+            offsets.append(offset)
+            mini_header_lengths.append(length)
+            clocks.append(tags['CLK'])
+            offset += self.PAGE_SIZE
+        return PageIndex(np.array(offsets, dtype='int64'),
+                         np.array(mini_header_lengths, dtype='int64'),
+                         clocks)
+
+    def _resync(self, offset):
+        """
+        Return the offset of the first valid page after the damaged page at
+        offset, or None if there isn't one. Page-size strides are tried
+        first, as most damage leaves the following pages in place, then the
+        bytes up to the first aligned hit are searched for shifted pages.
+        """
+        stop = offset + self.PAGE_SIZE
+        while stop < self.file_size():
+            if self._parse_mini_header(stop) is not None:
+                break
+            stop += self.PAGE_SIZE
+        stop = min(stop, self.file_size())
+        start = offset + 1
+        while True:
+            candidate = self._find(PAGE_SIGNATURE, start, stop)
+            if candidate is None:
+                break
+            if self._parse_mini_header(candidate) is not None:
+                return candidate
+            start = candidate + 1
+        return stop if stop < self.file_size() else None
+
+    def _find(self, pattern, start, stop):
+        """
+        Offset of the first occurrence of pattern in the file between start
+        and stop, or None. The file is read in chunks so only a small part of
+        it is in memory at once.
+        """
+        while start < stop:
+            length = min(SEARCH_CHUNK_SIZE, stop - start)
+            chunk = self._read(start, length + len(pattern) - 1)
+            position = chunk.find(pattern)
+            if position != -1:
+                return start + position
+            start += length
+        return None
+
+    def refresh(self):
+        """
+        Re-read the file size and index the pages written since the file was
+        opened or last refreshed, eg. while it is still being downloaded.
+        Returns the number of pages.
+        """
+        index = self.page_index()
+        n_indexed = len(index.offsets)
+        self._file_size = None
+        self._close_memory_map()
+        if self.header_error and self.header_error[0] >= n_indexed:
+            # the error was an incomplete last page, not a damaged one
+            self.header_error = None
+        offset = None
+        if n_indexed:
+            # the last page may have been incomplete when it was loaded
+            self._page_cache.discard(n_indexed - 1)
+            offset = int(index.offsets[-1]) + self.PAGE_SIZE
+        new_pages = self._scan_pages(offset, n_indexed)
+        self._page_index = PageIndex(
+            np.concatenate((index.offsets, new_pages.offsets)),
+            np.concatenate((index.mini_header_lengths,
+                            new_pages.mini_header_lengths)),
+            index.clocks + new_pages.clocks)
+        self._n_pages = None
+        self._page_times = None
+        return self.n_pages()
+
+    def _parse_mini_header(self, offset):
+        """
+        Return the length and tags of the mini-header at offset, or None if
+        there isn't a complete mini-header there
+        """
+        block = self._read(offset, MINI_HEADER_MAX_LENGTH)
+        if not block.startswith(MINI_HEADER_START):
+            return None
+        end = block.find(MINI_HEADER_END)
+        if end == -1:
+            return None
+        header_string = block[len(MINI_HEADER_START):end].decode('IBM437')
+        tags = parse_tags(header_string)
+        if not _is_clock(tags.get('CLK')):
+            return None
+        return end + len(MINI_HEADER_END), tags
+
+    def _index_values(self):
+        values = super()._index_values()
+        index = self.page_index()
+        values['page_index'] = {
+            'offsets': index.offsets.tolist(),
+            'mini_header_lengths': index.mini_header_lengths.tolist(),
+            'clocks': index.clocks}
+        return values
+
+    def _restore_index(self, values):
+        super()._restore_index(values)
+        index = values['page_index']
+        self._page_index = PageIndex(
+            np.array(index['offsets'], dtype='int64'),
+            np.array(index['mini_header_lengths'], dtype='int64'),
+            index['clocks'])
+
     def _load_page(self, i):
         if i >= self.n_pages():
             raise ValueError('page {} exceeds number of pages'.format(i))
 
-        ind = (self.data_start
-               + (i * self.PAGE_SIZE) + self.mini_header_length())
-        self._file.seek(ind)
-        return np.fromfile(self.file(),
-                           dtype='<i2',
-                           count=(self.PAGE_SIZE-self.mini_header_length())//2)
+        index = self.page_index()
+        ind = int(index.offsets[i] + index.mini_header_lengths[i])
+        count = int(self.page_lengths()[i])
+        if self._backend == 'mmap':
+            return np.frombuffer(self.memory_map(),
+                                 dtype='<i2',
+                                 count=count,
+                                 offset=ind)
+        self.file().seek(ind)
+        return np.fromfile(self.file(), dtype='<i2', count=count)
+
+    def page_lengths(self):
+        """
+        The number of samples in each page. Only the last page, and pages
+        cut short by a damaged region, can be short.
+        """
+        index = self.page_index()
+        data_offsets = index.offsets + index.mini_header_lengths
+        full_length = (self.PAGE_SIZE - index.mini_header_lengths) // 2
+        ends = np.append(index.offsets[1:], self.file_size())
+        remaining = (ends - data_offsets) // 2
+        return np.minimum(full_length, remaining)
+
+    def _load_pages(self, start, stop):
+        index = self.page_index()
+        offsets = index.offsets[start:stop]
+        mini_header_lengths = index.mini_header_lengths[start:stop]
+        pages_are_evenly_spaced = (
+            np.array_equal(offsets, offsets[0]
+                           + np.arange(len(offsets)) * self.PAGE_SIZE)
+            and np.all(mini_header_lengths == mini_header_lengths[0]))
+        if not pages_are_evenly_spaced:
+            return np.stack([self._load_page(i) for i in range(start, stop)])
+        if self._backend == 'mmap':
+            buffer = self.memory_map()
+            buffer_offset = int(offsets[0])
+        else:
+            # one read for the whole run of pages, mini-headers included
+            self.file().seek(int(offsets[0]))
+            buffer = self.file().read(len(offsets) * self.PAGE_SIZE)
+            buffer_offset = 0
+        return np.ndarray(
+            shape=(len(offsets), int(self.page_lengths()[start])),
+            dtype='<i2',
+            buffer=buffer,
+            offset=buffer_offset + int(mini_header_lengths[0]),
+            strides=(self.PAGE_SIZE, 2))
 
     def page_times(self):
-        if self._page_times:
+        """
+        Posix start time of each page as an int64 array
+        """
+        if self._page_times is not None:
             return self._page_times
-        page_start_times = []
-        for page_n in range(self.n_pages()):
-            header_string = self._read_mini_header(page_n)
-            mini_header = parse_tags(header_string)
-            time = mini_header['CLK']
-            page_time = datetime.strptime(time, '%Y-%m-%d %H:%M:%S')
-            epoch_time = epoch(page_time)
-            # The timestamp on all pages after the first have an
-            # extra second (permanent firmware bug)
-            if page_n > 0:
-                epoch_time -= 1
-            page_start_times.append(int(epoch_time))
+        clocks = np.array(self.page_index().clocks, dtype='datetime64[s]')
+        page_start_times = clocks.astype('int64')
+        # The timestamp on all pages after the first have an
+        # extra second (permanent firmware bug)
+        page_start_times[1:] -= 1
         self._page_times = page_start_times
         return self._page_times
 
-    def _read_mini_header(self, page):
-        file_position = self.file().tell()
-        self.file().seek(self.data_start + self.PAGE_SIZE * page)
-        header_string = self.file().read(self.mini_header_length())
-        self.file().seek(file_position)
-        header_string = header_string.decode('IBM437')
-        if not header_string.startswith('MHS'):
-            raise ValueError('MHS tag missing from mini-header')
-        header_string = header_string[5:-5]  # remove HDE\r\n and HDS\r\n
-        return header_string
-
     def mini_header_length(self):
-        if self._mini_header_length:
-            return self._mini_header_length
-        file_position = self.file().tell()
-        self.file().seek(self.data_start)
-        this_line = self.file().readline().decode('IBM437')
-        if not this_line.startswith('MHS'):
+        index = self.page_index()
+        if len(index.offsets) == 0:
             raise ValueError('MHS tag missing on first data page.')
-        while not this_line.startswith('MHE'):
-            this_line = self.file().readline().decode('IBM437')
-        end_pos = self._file.tell()
-        self.file().seek(file_position)
-        self._mini_header_length = end_pos-self.data_start
-        return self._mini_header_length
+        return int(index.mini_header_lengths[0])
+
+
+def _is_clock(clock):
+    if clock is None:
+        return False
+    try:
+        np.datetime64(clock, 's')
+    except ValueError:
+        return False
+    return True
@@ -0,0 +1,23 @@
+import numpy as np
+
+
+N_RAW_VALUES = 2 ** 16
+
+
+class LookupTable:
+    """
+    Convert 16 bit raw counts by looking them up in a table that holds the
+    conversion of every possible count. The table is made once, with
+    converter, for the calibration the converter was made with.
+    """
+    def __init__(self, converter, data_type):
+        self.converter = converter
+        raw_values = np.arange(N_RAW_VALUES, dtype=np.uint16).view(data_type)
+        with np.errstate(all='ignore'):
+            table = converter.convert(raw_values)
+        self.table = np.reshape(table, N_RAW_VALUES)
+
+    def convert(self, raw_data):
+        if raw_data.dtype.itemsize != 2:
+            return self.converter.convert(raw_data)
+        return self.table[raw_data.view(np.uint16)]
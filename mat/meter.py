@@ -9,3 +9,9 @@ class Meter(ABC):
     @abstractmethod
     def convert(self, raw_meter, temperature=None):
         pass  # pragma: no cover
+
+    def convert_into(self, raw_meter, out, temperature=None):
+        """
+        Like convert, writing the result into the preallocated array out
+        """
+        out[...] = self.convert(raw_meter, temperature)
@@ -3,6 +3,7 @@ from .time_converter import create_time_converter
 from pathlib import Path
 import h5py
 from datetime import datetime
+from mat.utils import posix_time
 
 
 def output_stream_factory(file_path, parameters):
@@ -19,6 +20,7 @@ class OutputStream:
         self.parameters = parameters
         self.streams = {}
         self.time_converter = create_time_converter(parameters['time_format'])
+        self.time_range = parameters.get('time_range')
 
     def add_stream(self, data_product):
         pass  # pragma: no cover
@@ -31,9 +33,24 @@ class OutputStream:
         self.streams[stream].data_format = data_format
 
     def write(self, stream, data, time):
+        if self.time_range:
+            data, time = self._crop_to_time_range(data, time)
+            if len(time) == 0:
+                return
+        self._write_stream(stream, data, time)
+
+    def _write_stream(self, stream, data, time):
         time = self.time_converter.convert(time)
         self.streams[stream].write(data, time)
 
+    def _crop_to_time_range(self, data, time):
+        """
+        Keep the samples where t0 <= time < t1
+        """
+        t0, t1 = [posix_time(t) for t in self.time_range]
+        keep = (time >= t0) & (time < t1)
+        return data[:, keep], time[keep]
+
 
 class CsvStream(OutputStream):
     def add_stream(self, data_product):
@@ -89,12 +106,14 @@ class HDF5Stream(OutputStream):
                 'Data',
                 (0, len(channels)),
                 maxshape=(None, len(channels)),
+                # h5py's default, single precision is enough for the data
+                dtype='float32',
                 compression='gzip',
                 shuffle=True
             )
             file[stream]['Data'].attrs['Columns'] = column_header
 
-    def write(self, stream, data, time):
+    def _write_stream(self, stream, data, time):
         with self.file() as file:
             ds_data = file[stream]['Data']
             ds_time = file[stream]['Time']
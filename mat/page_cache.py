@@ -0,0 +1,63 @@
+from collections import OrderedDict, namedtuple
+from threading import Lock
+
+
+PageCacheInfo = namedtuple('PageCacheInfo',
+                           ['hits', 'misses', 'pages', 'bytes', 'max_bytes'])
+
+
+class PageCache:
+    """
+    Least recently used cache of data pages. The size of the cache is
+    limited by the number of bytes held rather than by the number of pages.
+    """
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._pages = OrderedDict()
+        self._bytes = 0
+        self._lock = Lock()
+
+    def get(self, key, load):
+        """
+        Return the page stored under key, calling load(key) to read it if it
+        isn't cached. Loading happens under the cache lock so that threads
+        sharing a file never seek and read at the same time.
+        """
+        with self._lock:
+            if key in self._pages:
+                self._pages.move_to_end(key)
+                self.hits += 1
+                return self._pages[key]
+            self.misses += 1
+            page = load(key)
+            self._put(key, page)
+            return page
+
+    def _put(self, key, page):
+        if page.nbytes > self.max_bytes:
+            return
+        self._pages[key] = page
+        self._bytes += page.nbytes
+        while self._bytes > self.max_bytes:
+            _, oldest = self._pages.popitem(last=False)
+            self._bytes -= oldest.nbytes
+
+    def discard(self, key):
+        with self._lock:
+            page = self._pages.pop(key, None)
+            if page is not None:
+                self._bytes -= page.nbytes
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
+            self._bytes = 0
+
+    def info(self):
+        return PageCacheInfo(self.hits,
+                             self.misses,
+                             len(self._pages),
+                             self._bytes,
+                             self.max_bytes)
@@ -0,0 +1,55 @@
+from queue import Queue, Full
+from threading import Thread, Event
+
+
+_DONE = object()
+
+
+class PagePrefetcher:
+    """
+    Iterate over (key, load(key)) pairs while a background thread loads up
+    to 'depth' items ahead of the consumer. With depth items queued, one
+    being loaded and one being converted, reads overlap with conversion.
+    """
+    def __init__(self, load, keys, depth):
+        self.load = load
+        self.keys = keys
+        self._queue = Queue(maxsize=depth)
+        self._stop = Event()
+        self._thread = Thread(target=self._load_pages, daemon=True)
+
+    def __iter__(self):
+        self._thread.start()
+        try:
+            while True:
+                item = self._queue.get()
+                if item is _DONE:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            self.stop()
+
+    def _load_pages(self):
+        try:
+            for key in self.keys:
+                if self._stop.is_set():
+                    return
+                self._put((key, self.load(key)))
+        except Exception as error:
+            self._put(error)
+        self._put(_DONE)
+
+    def _put(self, item):
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return
+            except Full:
+                continue
+
+    def stop(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
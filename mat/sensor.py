@@ -1,22 +1,166 @@
+from mat.accel_mag_converter import AccelMagConverter
+from mat.binary_coded_decimal import BinaryCodedDecimal
+from mat.conversion_cache import ConversionCache
+from mat.header import Header
+from mat import jit
+from mat.lookup_table import LookupTable
 from mat.sensor_specification import AVAILABLE_SENSORS
+from copy import copy
+from functools import lru_cache
 import numpy as np
-from math import floor
-from heapq import merge
-from itertools import chain
 
 
-def create_sensors(header, calibration, seconds):
+DTYPES = ['float32', 'float64']
+# converters that decode the raw integers, so they aren't cast by use_dtype
+COUNT_CONVERTERS = (BinaryCodedDecimal, LookupTable)
+
+
+def create_sensors(header, calibration, seconds, conversion_cache=None):
     """
     The sensor filters (sensors) need to be built together because the
     individual sensor sequences depend on the order of all the sensors.
+    The sensors share conversion_cache, or a new ConversionCache if it is
+    None.
     """
     sensors = _build_sensors(header, calibration, seconds)
-    time_and_order = _time_and_order(sensors)
-    _load_sequence_into_sensors(sensors, time_and_order)
+    if conversion_cache is None:
+        conversion_cache = ConversionCache()
+    for sensor in sensors:
+        sensor.conversion_cache = conversion_cache
+    sample_indexes = _sample_indexes(_layout_key(header), int(seconds))
+    for sensor, sample_index in zip(sensors, sample_indexes):
+        sensor.sample_index = sample_index
     _add_temperature_dependency(sensors)
     return sensors
 
 
+def select_sensors(sensors, names):
+    """
+    The sensors named in 'names', or all the sensors if names is None.
+    Names of sensors that aren't enabled in the file are ignored. Sensors
+    that are left out still feed the sensors that depend on them, eg.
+    temperature for the magnetometer.
+    """
+    if names is None:
+        return sensors
+    known_names = [spec.name for spec in AVAILABLE_SENSORS]
+    unknown_names = [name for name in names if name not in known_names]
+    if unknown_names:
+        raise ValueError('Unknown sensors: {}'.format(
+            ', '.join(unknown_names)))
+    return [sensor for sensor in sensors if sensor.name in names]
+
+
+def use_lookup_tables(sensors):
+    """
+    Convert the 1 channel sensors that don't depend on temperature with
+    lookup tables, see LookupTable
+    """
+    for sensor in sensors:
+        if (sensor.channels == 1
+                and not sensor.sensor_spec.temp_dependant
+                and hasattr(sensor, 'converter')):
+            sensor.converter = LookupTable(sensor.converter,
+                                           sensor.data_type)
+
+
+def use_dtype(sensors, dtype):
+    """
+    Convert in dtype, one of DTYPES, instead of double precision. The raw
+    counts, which any float type holds exactly, and the calibration
+    coefficients are cast to dtype so the conversion is done in it. Times
+    stay double precision.
+    """
+    if str(dtype) not in DTYPES:
+        raise ValueError('Unknown dtype: {}'.format(dtype))
+    dtype = np.dtype(dtype)
+    for sensor in sensors:
+        sensor.dtype = dtype
+        if hasattr(sensor, 'converter'):
+            sensor.converter = _cast_coefficients(sensor.converter, dtype)
+
+
+def _cast_coefficients(converter, dtype):
+    """
+    A copy of converter with its floating point arrays, and those of the
+    converters it wraps, in dtype
+    """
+    converter = copy(converter)
+    for name, value in list(vars(converter).items()):
+        if isinstance(value, np.ndarray) and value.dtype.kind == 'f':
+            setattr(converter, name, value.astype(dtype))
+        elif isinstance(value, np.floating):
+            setattr(converter, name, dtype.type(value))
+        elif hasattr(value, 'convert'):
+            setattr(converter, name, _cast_coefficients(value, dtype))
+    return converter
+
+
+def use_jit(sensors):
+    """
+    Gather, convert and average with the compiled kernels in mat.jit, if
+    numba is installed. Otherwise the sensors are left as they are.
+    """
+    if not jit.available():
+        return
+    for sensor in sensors:
+        sensor.jit = True
+        if hasattr(sensor, 'converter'):
+            sensor.converter = jit.compiled_converter(sensor.converter)
+
+
+def accel_mag_pair(sensors):
+    """
+    An AccelMagPair for the accelerometer and magnetometer in sensors, or
+    None if they can't be converted together
+    """
+    names = [sensor.name for sensor in sensors]
+    if 'Accelerometer' not in names or 'Magnetometer' not in names:
+        return None
+    accelerometer = sensors[names.index('Accelerometer')]
+    magnetometer = sensors[names.index('Magnetometer')]
+    if not (hasattr(accelerometer, 'converter')
+            and hasattr(magnetometer, 'converter')):
+        return None
+    sample_index = accelerometer.sample_index.interleave(
+        magnetometer.sample_index)
+    if sample_index is None:
+        return None
+    return AccelMagPair(accelerometer, magnetometer, sample_index)
+
+
+# The header tags that decide which sensors are built and how they sample
+LAYOUT_TAGS = sorted({tag
+                      for spec in AVAILABLE_SENSORS
+                      for tag in (spec.enabled_tag,
+                                  spec.interval_tag,
+                                  spec.burst_rate_tag,
+                                  spec.burst_count_tag)
+                      if tag})
+LAYOUT_CACHE_SIZE = 32
+
+
+def _layout_key(header):
+    return tuple((tag, header.tag(tag)) for tag in LAYOUT_TAGS)
+
+
+@lru_cache(maxsize=LAYOUT_CACHE_SIZE)
+def _sample_indexes(layout_key, seconds):
+    """
+    The sample indexes of the sensors built from the header tags in
+    layout_key. Files with the same configuration share them, so they are
+    made read-only.
+    """
+    sensors = _build_sensors(Header.from_tags('', dict(layout_key)),
+                             None,
+                             seconds)
+    _load_sequence_into_sensors(sensors, seconds)
+    for sensor in sensors:
+        sensor.sample_index.offsets.flags.writeable = False
+        sensor.sample_index.tail_offsets.flags.writeable = False
+    return tuple(sensor.sample_index for sensor in sensors)
+
+
 def _build_sensors(header, calibration, seconds):
     sensors = []
     for sensor_spec in AVAILABLE_SENSORS:
@@ -34,25 +178,81 @@ def _sensor_factory(sensor_spec, header, calibration, seconds):
     return Sensor(sensor_spec, header, calibration, seconds)
 
 
-def _time_and_order(sensors):
+def _time_and_order(sensors, seconds):
+    """
+    Return the sample times and sensor orders of 'sensors' over 'seconds'
+    as two arrays with one entry per sample, sensor by sensor, and the
+    permutation that sorts the combined sequence by time, then by order.
+    The sort is stable, so the channels of a sample stay in order.
+
+    A burst that outlasts its interval runs into the next one, so a
+    sensor's times can go back. A sample then follows the latest sample
+    generated before it, as in a merge of the sensors' sequences, and the
+    sensor's own samples keep their order.
+    """
+    if not sensors:
+        return np.empty(0), np.empty(0), np.empty(0, dtype=np.intp)
+    sample_times = [np.maximum.accumulate(
+        np.repeat(sensor.sample_times(seconds), sensor.channels))
+        for sensor in sensors]
+    times = np.concatenate(sample_times)
+    orders = np.concatenate([np.full(len(t), sensor.order)
+                             for t, sensor in zip(sample_times, sensors)])
+    return times, orders, np.lexsort((orders, times))
+
+
+def _sequence(sensors, seconds):
     """
-    Return a fully combined time and sensor-order sequence for 'sensors'.
-    The output is a list of tuples containing the sample time and order
-    sorted by time, then by order.
+    Positions of each sensor's samples in the combined sequence over
+    'seconds'. A sample's position is its rank in the sort. Each sensor's
+    samples are contiguous in the unsorted arrays and their ranks are
+    already increasing.
     """
-    time_and_order = []
+    times, orders, sort_order = _time_and_order(sensors, seconds)
+    rank = np.empty(len(times), dtype=np.intp)
+    rank[sort_order] = np.arange(len(times))
+    positions = []
+    start = 0
     for sensor in sensors:
-        sample_times = sensor.full_sample_times()
-        sensor_time_order = [(t, sensor.order) for t in sample_times]
-        time_and_order.append(sensor_time_order)
-    return list(merge(*time_and_order))
+        stop = start + int(np.count_nonzero(orders == sensor.order))
+        positions.append(rank[start:stop])
+        start = stop
+    return positions
 
 
-def _load_sequence_into_sensors(sensors, time_and_order):
-    for sensor in sensors:
-        sample_ind = [i for i, s in enumerate(time_and_order)
-                      if s[1] == sensor.order]
-        sensor.sample_ind = np.array(sample_ind)
+def _load_sequence_into_sensors(sensors, seconds):
+    """
+    The sequence is worked out for one period and for the partial period
+    left at the end of 'seconds' (the tail) only. The tail's samples all
+    come after the last full period.
+    """
+    period = _period(sensors, seconds)
+    n_records, tail_seconds = divmod(seconds, period)
+    offsets = _sequence(sensors, period)
+    tail_offsets = _sequence(sensors, tail_seconds)
+    record_length = sum(len(o) for o in offsets)
+    for sensor, offset, tail_offset in zip(sensors, offsets, tail_offsets):
+        sensor.sample_index = SampleIndex(record_length,
+                                          offset,
+                                          int(n_records),
+                                          tail_offset,
+                                          sensor.channels)
+
+
+def _period(sensors, seconds):
+    """
+    The sample sequence repeats every least common multiple of the sensor
+    intervals, as long as each burst ends before the sensor's next
+    interval. Otherwise the whole of 'seconds' is treated as one period.
+    """
+    if not sensors:
+        return max(seconds, 1)
+    period = int(np.lcm.reduce([sensor.interval for sensor in sensors]))
+    bursts_fit = all((s.burst_count - 1) / s.burst_rate < s.interval
+                     for s in sensors)
+    if not bursts_fit or not 0 < period <= seconds:
+        return max(seconds, 1)
+    return period
 
 
 def _add_temperature_dependency(sensors):
@@ -71,11 +271,25 @@ def major_interval_info(header):
     a major interval.
     """
     major_interval = header.major_interval()
-    sensors = create_sensors(header, None, major_interval)
+    return major_interval, bytes_per_interval(header, major_interval)
+
+
+def bytes_per_interval(header, seconds):
+    """
+    The number of data bytes the sensors enabled in header record in
+    'seconds', worked out from the tags without building the sensors. A
+    sensor samples a burst of burst_count values per channel at the start
+    of each of its intervals.
+    """
     n_bytes = 0
-    for s in sensors:
-        n_bytes += s.samples_per_page() * 2
-    return major_interval, n_bytes
+    for spec in AVAILABLE_SENSORS:
+        if not header.tag(spec.enabled_tag):
+            continue
+        interval = header.tag(spec.interval_tag)
+        burst_count = header.tag(spec.burst_count_tag) or 1
+        n_intervals = -(-seconds // interval)
+        n_bytes += spec.channels * burst_count * n_intervals * 2
+    return n_bytes
 
 
 class Sensor:
@@ -87,78 +301,128 @@ class Sensor:
         self.burst_rate = header.tag(sensor_spec.burst_rate_tag) or 1
         self.burst_count = header.tag(sensor_spec.burst_count_tag) or 1
         self.data_type = sensor_spec.data_type
-        self.sample_ind = None
+        self.sample_index = None
         self.seconds = seconds
         self.order = sensor_spec.order
-        self.cache = {'page_time': None, 'data': None}
-        self._full_sample_times_cache = None
+        self.conversion_cache = ConversionCache()
+        self.jit = False
+        self.dtype = None
+        self._sample_times_cache = None
         if calibration:
             self.converter = sensor_spec.converter(calibration)
 
+    @property
+    def sample_ind(self):
+        return self.sample_index.indices()
+
     def full_sample_times(self):
         """
         The elapsed time in seconds from the start of the data page when a
         sensor samples. n channel sensors return n times per sample.
         """
-        if self._full_sample_times_cache is None:
-            times = [[interval+burst/self.burst_rate]*self.channels
-                     for interval in range(0, self.seconds, self.interval)
-                     for burst in range(self.burst_count)]
-            self._full_sample_times_cache = list(chain.from_iterable(times))
-        return self._full_sample_times_cache
+        return np.repeat(self._sample_times(), self.channels)
+
+    def sample_times(self, seconds):
+        """
+        1-d sample times for the first 'seconds' of a page, one time for
+        each sample of a burst at the start of each interval
+        """
+        intervals = np.arange(0, seconds, self.interval)
+        bursts = np.arange(self.burst_count) / self.burst_rate
+        return np.ravel(intervals[:, np.newaxis] + bursts)
 
     def _parse_page(self, data_page):
         """
         Return raw data and time as a tuple
         """
-        index = np.searchsorted(self.sample_ind, len(data_page))
-        sample_ind = self.sample_ind[:index]
-        sensor_data = self._remove_partial_burst(data_page[sample_ind])
-        sensor_data = self._reshape_to_n_channels(sensor_data)
-        sensor_data = sensor_data.astype(self.data_type)
-        n_samples = sensor_data.shape[1]
-        time = self._sample_times()[:n_samples]
+        return self._parse_block(data_page[np.newaxis, :])
+
+    def _parse_block(self, block):
+        """
+        Like _parse_page for a 2-d block of equal length pages. The samples
+        from all pages are joined into one (channels, n) array. The time is
+        the elapsed time within a page for the samples of one page.
+        """
+        n_values = self._whole_bursts(self.sample_index.count(block.shape[1]))
+        sensor_data = self.sample_index.gather(block,
+                                               n_values,
+                                               self.data_type,
+                                               self.jit)
+        time = self._sample_times()[:n_values // self.channels]
         return sensor_data, time
 
-    def _remove_partial_burst(self, sensor_data):
+    def _whole_bursts(self, n_values):
         samples_per_burst = self.burst_count * self.channels
-        n_bursts = floor(len(sensor_data) / samples_per_burst)
-        return sensor_data[:n_bursts * samples_per_burst]
+        return n_values - n_values % samples_per_burst
 
     def _sample_times(self):
         """
         1-d sample times. If a sensor has n channels, only one time is returned
-        for each sample
+        for each sample. The array is shared, so it is read-only.
         """
-        full_sample_times = self.full_sample_times()
-        full_sample_times = self._reshape_to_n_channels(full_sample_times)
-        return full_sample_times[0, :]
+        if self._sample_times_cache is None:
+            self._sample_times_cache = self.sample_times(self.seconds)
+            self._sample_times_cache.flags.writeable = False
+        return self._sample_times_cache
 
     def _average_bursts(self, data, time):
-        if self.burst_count == 1:
-            return data, time
-        data = np.mean(np.reshape(data, (self.channels,
-                                         -1,
-                                         self.burst_count)), axis=2)
-        time = time[::self.burst_count]
-        return data, time
+        return _average_bursts(data, time, self.burst_count, self.jit)
 
     def _reshape_to_n_channels(self, data):
         return np.reshape(data, (self.channels, -1), order='F')
 
     def samples_per_page(self):
-        return len(self.sample_ind)
+        return len(self.sample_index)
 
     def convert(self, data_page, average, page_time):
-        if self.cache['page_time'] == page_time:
-            return self.cache['data']
+        return self.conversion_cache.get(
+            ('page', np.asarray(page_time).tolist()),
+            (self.order, average),
+            lambda: self._cast_data(*self._convert(data_page,
+                                                   average,
+                                                   page_time)))
+
+    def convert_block(self, block, average, page_times):
+        """
+        Convert a 2-d block of pages in one pass. The data and time of all
+        the pages are joined in page order.
+        """
+        return self.conversion_cache.get(
+            ('block', tuple(page_times.tolist())),
+            (self.order, average),
+            lambda: self._cast_data(*self._convert_block(block,
+                                                         average,
+                                                         page_times)))
+
+    def _cast(self, values):
+        """ values in the dtype set by use_dtype """
+        if self.dtype is None:
+            return values
+        return values.astype(self.dtype, copy=False)
+
+    def _cast_data(self, data, time):
+        return self._cast(data), time
+
+    def _cast_raw(self, raw_data):
+        if isinstance(self.converter, COUNT_CONVERTERS):
+            return raw_data
+        return self._cast(raw_data)
+
+    def _convert(self, data_page, average, page_time):
         raw_data, time = self._parse_page(data_page)
-        data = self.converter.convert(raw_data)
+        data = self.converter.convert(self._cast_raw(raw_data))
+        if average:
+            data, time = self._average_bursts(data, time)
+        time = time + page_time
+        return data, time
+
+    def _convert_block(self, block, average, page_times):
+        raw_data, time = self._parse_block(block)
+        data = self.converter.convert(self._cast_raw(raw_data))
+        time = np.ravel(page_times[:, np.newaxis] + time)
         if average:
             data, time = self._average_bursts(data, time)
-        time += page_time
-        self.cache = {'page_time': page_time, 'data': (data, time)}
-        return self.cache['data']
+        return data, time
 
 
 class TempDependantSensor(Sensor):
@@ -166,16 +430,293 @@ class TempDependantSensor(Sensor):
         super().__init__(sensor_spec, header, calibration, seconds)
         self.temperature = None
 
-    def convert(self, data_page, average, page_time):
+    def _convert(self, data_page, average, page_time):
         if not self.temperature:
-            return super().convert(data_page, average, page_time)
+            return super()._convert(data_page, average, page_time)
         raw_data, time = self._parse_page(data_page)
-        time += page_time
+        time = time + page_time
         temp, temp_time = self.temperature.convert(data_page,
                                                    average,
                                                    page_time)
-        temp_interp = np.interp(time, temp_time, temp[0, :])
-        data = self.converter.convert(raw_data, temp_interp)
+        temp_interp = _temperature_at(time, temp_time, temp[0, :])
+        data = self.converter.convert(self._cast_raw(raw_data),
+                                      self._cast(temp_interp))
+        if average:
+            data, time = self._average_bursts(data, time)
+        return data, time
+
+    def _convert_block(self, block, average, page_times):
+        if not self.temperature:
+            return super()._convert_block(block, average, page_times)
+        raw_data, time = self._parse_block(block)
+        time = page_times[:, np.newaxis] + time
+        temp, temp_time = self.temperature.convert_block(block,
+                                                         average,
+                                                         page_times)
+        temp_interp = _temperature_in_pages(time, temp_time, temp)
+        time = np.ravel(time)
+        data = self.converter.convert(self._cast_raw(raw_data),
+                                      self._cast(temp_interp))
         if average:
             data, time = self._average_bursts(data, time)
         return data, time
+
+
+def _temperature_at(time, temp_time, temp):
+    # no need to interpolate when the temperature was sampled with the data
+    if np.array_equal(time, temp_time):
+        return temp
+    return np.interp(time, temp_time, temp)
+
+
+def _temperature_in_pages(time, temp_time, temp):
+    """
+    The temperature at the 2-d (page, sample) times, interpolated page by
+    page so each page is treated as on its own. temp and temp_time are the
+    converted temperature of all the pages joined.
+    """
+    temp = np.reshape(temp[0, :], (len(time), -1))
+    temp_time = np.reshape(temp_time, (len(time), -1))
+    return np.concatenate([_temperature_at(*args) for args in
+                           zip(time, temp_time, temp)])
+
+
+def _average_bursts(data, time, burst_count, compiled=False):
+    """ The mean of each burst of burst_count samples, and its start time """
+    if burst_count == 1:
+        return data, time
+    if compiled:
+        return jit.average_bursts(data, burst_count), time[::burst_count]
+    data = np.mean(np.reshape(data, (len(data), -1, burst_count)), axis=2)
+    return data, time[::burst_count]
+
+
+class AccelMagPair:
+    """
+    The accelerometer and magnetometer as one 6 channel sensor. They sample
+    at the same times, one after the other, so their values are gathered
+    in one pass and converted into one preallocated array. convert returns
+    the (6, n) data, accelerometer channels first.
+
+    The pair samples like the accelerometer and uses its conversion cache,
+    dtype and jit setting. The magnetometer's temperature sensor, if any,
+    gives the temperature.
+    """
+    def __init__(self, accelerometer, magnetometer, sample_index):
+        self.accelerometer = accelerometer
+        self.magnetometer = magnetometer
+        self.name = 'AccelMag'
+        self.channels = accelerometer.channels + magnetometer.channels
+        self.order = (accelerometer.order, magnetometer.order)
+        self.sample_index = sample_index
+        self.converter = AccelMagConverter(accelerometer.converter,
+                                           magnetometer.converter)
+
+    @property
+    def sensor_spec(self):
+        return self.accelerometer.sensor_spec
+
+    @property
+    def conversion_cache(self):
+        return self.accelerometer.conversion_cache
+
+    @property
+    def temperature(self):
+        return self.magnetometer.temperature
+
+    @property
+    def sample_ind(self):
+        return self.sample_index.indices()
+
+    def convert(self, data_page, average, page_time):
+        def convert_page():
+            temperature = None
+            if self.temperature:
+                temperature = self.temperature.convert(data_page,
+                                                       average,
+                                                       page_time)
+            return self._convert(data_page[np.newaxis, :],
+                                 average,
+                                 np.array([page_time]),
+                                 temperature)
+        return self.conversion_cache.get(
+            ('page', np.asarray(page_time).tolist()),
+            (self.order, average),
+            convert_page)
+
+    def convert_block(self, block, average, page_times):
+        def convert_pages():
+            temperature = None
+            if self.temperature:
+                temperature = self.temperature.convert_block(block,
+                                                             average,
+                                                             page_times)
+            return self._convert(block, average, page_times, temperature)
+        return self.conversion_cache.get(
+            ('block', tuple(page_times.tolist())),
+            (self.order, average),
+            convert_pages)
+
+    def _convert(self, block, average, page_times, temperature):
+        """
+        Convert a 2-d block of pages, given the (data, time) of its
+        temperature or None
+        """
+        accelerometer = self.accelerometer
+        n_values = self.sample_index.count(block.shape[1])
+        n_values -= n_values % (accelerometer.burst_count * self.channels)
+        raw_data = self.sample_index.gather(block,
+                                            n_values,
+                                            accelerometer.data_type,
+                                            accelerometer.jit)
+        time = page_times[:, np.newaxis] \
+            + accelerometer._sample_times()[:n_values // self.channels]
+        temp_interp = None
+        if temperature:
+            temp_interp = accelerometer._cast(
+                _temperature_in_pages(time, temperature[1], temperature[0]))
+        data = self.converter.convert(accelerometer._cast(raw_data),
+                                      temp_interp)
+        time = np.ravel(time)
+        if average:
+            data, time = _average_bursts(data,
+                                         time,
+                                         accelerometer.burst_count,
+                                         accelerometer.jit)
+        return accelerometer._cast(data), time
+
+
+class SampleIndex:
+    """
+    Positions of one sensor's values in a page. The sampling of all the
+    sensors repeats every period, so only the offsets of the sensor's
+    values in one period's record of record_length values are kept. The
+    record repeats n_records times and is followed by the tail, a partial
+    record with its own offsets.
+    """
+    def __init__(self,
+                 record_length,
+                 offsets,
+                 n_records,
+                 tail_offsets,
+                 channels):
+        self.record_length = record_length
+        self.offsets = offsets
+        self.n_records = n_records
+        self.tail_offsets = tail_offsets
+        self.channels = channels
+        self._selectors = [_selector(offsets[c::channels])
+                           for c in range(channels)]
+
+    def __len__(self):
+        return self.n_records * len(self.offsets) + len(self.tail_offsets)
+
+    def indices(self):
+        """ All the positions as one array """
+        records = (self.offsets + self.record_length
+                   * np.arange(self.n_records)[:, np.newaxis])
+        tail = self.tail_offsets + self.record_length * self.n_records
+        return np.concatenate((records.ravel(), tail))
+
+    def count(self, length):
+        """ The number of positions before length """
+        n_full = self._n_full_records(length)
+        rest = length - n_full * self.record_length
+        return (n_full * len(self.offsets)
+                + int(np.searchsorted(self._partial(n_full), rest)))
+
+    def gather(self, block, n_values, dtype, compiled=False):
+        """
+        The first n_values values of each page in a 2-d block as a
+        (channels, n) array of dtype, pages joined in order. Whole records
+        are gathered through a (pages, records, record_length) view of the
+        block, channel by channel, with a slice where a channel's offsets
+        are evenly spaced. With compiled, the other channels are gathered by
+        the kernel in mat.jit.
+        """
+        n_pages = len(block)
+        per_record = len(self.offsets)
+        n_full = self._n_full_records(block.shape[1])
+        if per_record:
+            n_full = min(n_full, n_values // per_record)
+        data = np.empty((self.channels, n_pages, n_values // self.channels),
+                        dtype=dtype)
+        n_samples = n_full * per_record // self.channels
+        if n_samples:
+            records = np.reshape(block[:, :n_full * self.record_length],
+                                 (n_pages, n_full, self.record_length))
+            for channel, selector in enumerate(self._selectors):
+                target = np.reshape(data[channel, :, :n_samples],
+                                    (n_pages, n_full, -1))
+                if compiled and not isinstance(selector, slice):
+                    jit.gather(records, selector, target)
+                else:
+                    target[...] = _take(records, selector)
+        n_rest = n_values - n_full * per_record
+        if n_rest:
+            rest = (self._partial(n_full)[:n_rest]
+                    + n_full * self.record_length)
+            values = np.reshape(block[:, rest],
+                                (n_pages, -1, self.channels))
+            data[:, :, n_samples:] = np.transpose(values, (2, 0, 1))
+        return np.reshape(data, (self.channels, -1))
+
+    def interleave(self, other):
+        """
+        The positions of this sensor's values and other's together, as one
+        sensor with other's channels after this one's, or None if the
+        values in a page aren't laid out sample by sample that way
+        """
+        if (other.record_length != self.record_length
+                or other.n_records != self.n_records):
+            return None
+        offsets = _interleave(self.offsets, self.channels,
+                              other.offsets, other.channels)
+        tail_offsets = _interleave(self.tail_offsets, self.channels,
+                                   other.tail_offsets, other.channels)
+        if offsets is None or tail_offsets is None:
+            return None
+        return SampleIndex(self.record_length,
+                           offsets,
+                           self.n_records,
+                           tail_offsets,
+                           self.channels + other.channels)
+
+    def _n_full_records(self, length):
+        if self.record_length == 0:
+            return 0
+        return min(length // self.record_length, self.n_records)
+
+    def _partial(self, n_full):
+        if n_full < self.n_records:
+            return self.offsets
+        return self.tail_offsets
+
+
+def _interleave(offsets, channels, other_offsets, other_channels):
+    if len(offsets) // channels != len(other_offsets) // other_channels:
+        return None
+    interleaved = np.ravel(np.hstack((
+        np.reshape(offsets, (-1, channels)),
+        np.reshape(other_offsets, (-1, other_channels)))))
+    if np.any(np.diff(interleaved) <= 0):
+        return None
+    return interleaved
+
+
+def _take(records, selector):
+    """ The values at selector in the last axis of records """
+    if isinstance(selector, slice):
+        return records[..., selector]
+    # np.take keeps the result in C order, unlike fancy indexing
+    return np.take(records, selector, axis=-1)
+
+
+def _selector(offsets):
+    """ A slice for evenly spaced offsets, or else the offsets """
+    if len(offsets) == 0:
+        return offsets
+    step = offsets[1] - offsets[0] if len(offsets) > 1 else 1
+    if step > 0 and np.all(np.diff(offsets) == step):
+        return slice(int(offsets[0]), int(offsets[-1]) + 1, int(step))
+    return offsets
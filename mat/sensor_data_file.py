@@ -2,30 +2,66 @@
 # Copyright (c) 2018 Lowell Instruments, LLC, some rights reserved
 
 from mat.header import Header
-from mat.calibration_factories import calibration_from_string
+from mat.calibration_factories import (
+    calibration_from_string,
+    calibration_from_coefficients,
+)
+from mat.index_cache import load_index, save_index
+from mat.page_cache import PageCache
+from mat.utils import posix_time
 from abc import ABC, abstractmethod
+from io import BytesIO
+import mmap
+import numpy as np
 
 
 FULL_HEADER_LENGTH = 1000
+BACKENDS = ['file', 'mmap']
+BUFFER_TYPES = (bytes, bytearray, memoryview, BytesIO)
+DEFAULT_PAGE_CACHE_BYTES = 64 * 1024 ** 2
 
 
 class SensorDataFile(ABC):
-    def __init__(self, file_path, calibration=None):
+    def __init__(self,
+                 file_path,
+                 calibration=None,
+                 backend='file',
+                 index_cache=False,
+                 page_cache_bytes=DEFAULT_PAGE_CACHE_BYTES):
+        """
+        file_path is either a path or one of BUFFER_TYPES holding the whole
+        file. Pages of a buffer are always views into it, and buffers have
+        no index cache.
+        """
         self._file_path = file_path
+        self._backend = backend
         self._file = None
+        self._memory_map = None
+        self._buffer = None
+        if backend not in BACKENDS:
+            raise ValueError('Unknown backend: {}'.format(backend))
+        if isinstance(file_path, BUFFER_TYPES):
+            self._buffer = _memoryview(file_path)
+            self._backend = 'mmap'
+            index_cache = False
         self._header = None
         self.header_error = None
         self._calibration = calibration
         self._page_times = None
-        self._cached_page = None
-        self._cached_page_n = None
+        self._page_cache = PageCache(page_cache_bytes)
         self._file_size = None
-        self._mini_header_length = None
+        self._page_index = None
         self._samples_per_page = None
         self._n_pages = None
+        self._user_calibration = calibration is not None
+        index = load_index(file_path) if index_cache else None
+        if index:
+            self._restore_index(index)
         self._n_pages = self.n_pages()
         if self.data_bytes() == 0:
             raise NoDataError('There is no data in the file')
+        if index_cache and not index:
+            save_index(file_path, self._index_values())
 
     @property
     @abstractmethod
@@ -36,6 +72,14 @@ class SensorDataFile(ABC):
     def _load_page(self, i):
         pass  # pragma: no cover
 
+    @abstractmethod
+    def _load_pages(self, start, stop):
+        pass  # pragma: no cover
+
+    @abstractmethod
+    def page_lengths(self):
+        pass  # pragma: no cover
+
     @abstractmethod
     def mini_header_length(self):
         pass  # pragma: no cover
@@ -49,11 +93,34 @@ class SensorDataFile(ABC):
         pass  # pragma: no cover
 
     def page(self, i):
-        if self._cached_page_n == i:
-            return self._cached_page
-        self._cached_page_n = i
-        self._cached_page = self._load_page(i)
-        return self._cached_page
+        return self._page_cache.get(i, self._load_page)
+
+    def pages(self, start, stop):
+        """
+        Pages start to stop-1 as a 2-d (n_pages, samples per page) array.
+        The pages must all be the same length. Pages read this way are not
+        added to the page cache.
+        """
+        if not 0 <= start < stop <= self.n_pages():
+            raise ValueError('invalid page range {}-{}'.format(start, stop))
+        if len(set(self.page_lengths()[start:stop])) != 1:
+            raise ValueError('pages {}-{} are not the same length'.format(
+                start, stop - 1))
+        return self._load_pages(start, stop)
+
+    def page_cache_info(self):
+        return self._page_cache.info()
+
+    def pages_between(self, t0, t1):
+        """
+        Range of the page numbers holding data from t0 up to, but not
+        including, t1. The times are datetimes or posix seconds. A page is
+        assumed to last until the next page starts.
+        """
+        page_times = self.page_times()
+        first = np.searchsorted(page_times, posix_time(t0), side='right') - 1
+        last = np.searchsorted(page_times, posix_time(t1), side='left')
+        return range(max(int(first), 0), int(last))
 
     def header(self):
         if self._header:
@@ -80,9 +147,21 @@ class SensorDataFile(ABC):
             self._file = open(self._file_path, 'rb')
         return self._file
 
+    def memory_map(self):
+        if self._buffer is not None:
+            return self._buffer
+        if self._memory_map is None:
+            self._memory_map = mmap.mmap(self.file().fileno(),
+                                         0,
+                                         access=mmap.ACCESS_READ)
+        return self._memory_map
+
     def file_size(self):
         if self._file_size:
             return self._file_size
+        if self._buffer is not None:
+            self._file_size = len(self._buffer)
+            return self._file_size
         file_pos = self.file().tell()
         self.file().seek(0, 2)
         self._file_size = self.file().tell()
@@ -93,21 +172,86 @@ class SensorDataFile(ABC):
         return self.file_size() - self.data_start - self.mini_header_length()
 
     def _read_full_header(self):
-        file_position = self.file().tell()
-        self.file().seek(0)
-        full_header = self.file().read(FULL_HEADER_LENGTH).decode('IBM437')
-        self.file().seek(file_position)
-        return full_header
+        return self._read(0, FULL_HEADER_LENGTH).decode('IBM437')
+
+    def _read(self, offset, length):
+        if self._backend == 'mmap':
+            return bytes(self.memory_map()[offset:offset + length])
+        self.file().seek(offset)
+        return self.file().read(length)
+
+    def _index_values(self):
+        """
+        The values stored in the index cache. Subclasses extend this with
+        their own values and restore them in _restore_index()
+        """
+        return {'header': {'string': self.header().header_string,
+                           'tags': self.header().tags()},
+                'calibration': self._file_calibration_coefficients(),
+                'n_pages': self.n_pages(),
+                'page_times': self.page_times().tolist(),
+                'header_error': self.header_error}
+
+    def _restore_index(self, values):
+        header = values['header']
+        self._header = Header.from_tags(header['string'], header['tags'])
+        if values['calibration'] and not self._calibration:
+            self._calibration = calibration_from_coefficients(
+                values['calibration'])
+        self._n_pages = values['n_pages']
+        self._page_times = np.array(values['page_times'], dtype='int64')
+        if values['header_error']:
+            self.header_error = tuple(values['header_error'])
+
+    def _file_calibration_coefficients(self):
+        if self._user_calibration:
+            return None
+        try:
+            return self.calibration().coefficients
+        except ValueError:
+            return None
 
     def close(self):
+        self._close_memory_map()
+        self._release_buffer()
         if self._file:
             self._file.close()
         self._file = None
 
+    def _close_memory_map(self):
+        if self._memory_map is None:
+            return
+        try:
+            self._memory_map.close()
+        except BufferError:
+            # pages are zero-copy views into the map. If any are still
+            # referenced, the map is released when the last one is freed.
+            pass
+        self._memory_map = None
+
+    def _release_buffer(self):
+        """ Let the caller write to, or close, the buffer again """
+        if self._buffer is None:
+            return
+        self._page_cache.clear()
+        try:
+            self._buffer.release()
+        except BufferError:
+            # as with the memory map, pages still referenced keep the
+            # buffer until the last one is freed
+            pass
+        self._buffer = None
+
     def __del__(self):
         if self._file:
             self.close()
 
 
+def _memoryview(buffer):
+    if isinstance(buffer, BytesIO):
+        buffer = buffer.getbuffer()
+    return memoryview(buffer).cast('B')
+
+
 class NoDataError(Exception):
     pass
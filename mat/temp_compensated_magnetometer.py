@@ -1,11 +1,14 @@
 from numpy import (
     array,
-    tile,
+    clip,
+    empty,
+    multiply,
 )
 from mat.cubic_magnetometer import CubicMagnetometer
 
 
 TEMPERATURE_KEYS = ['TMX', 'TMY', 'TMZ', 'MRF']
+TEMPERATURE_RANGE = (-20, 50)
 
 
 class TempCompensatedMagnetometer(CubicMagnetometer):
@@ -20,16 +23,25 @@ class TempCompensatedMagnetometer(CubicMagnetometer):
 
     def convert(self, raw_magnetometer, temperature=None):
         """
-        NOTE: temperature must be a numpy array, even if it is a single value
+        NOTE: temperature must be a numpy array, even if it is a single value.
+        It is not modified.
         """
         magnetometer = super().convert(raw_magnetometer)
-        if temperature is None:
-            return magnetometer
-        temp_range = [-20, 50]
-        temperature[temperature < temp_range[0]] = temp_range[0]
-        temperature[temperature > temp_range[1]] = temp_range[1]
-        assert temperature.shape == (raw_magnetometer.shape[1],)
-        temperature_delta = tile(temperature, (3, 1)) - self.temp_reference
-        magnetometer = (magnetometer +
-                        temperature_delta * self.temperature_slope)
+        self._compensate(magnetometer, temperature)
         return magnetometer
+
+    def convert_into(self, raw_magnetometer, out, temperature=None):
+        super().convert_into(raw_magnetometer, out)
+        self._compensate(out, temperature)
+
+    def _compensate(self, magnetometer, temperature):
+        if temperature is None:
+            return
+        assert temperature.shape == (magnetometer.shape[1],)
+        temperature_delta = clip(temperature, *TEMPERATURE_RANGE)
+        temperature_delta = temperature_delta - self.temp_reference
+        # one channel at a time, so no (3, n) temporaries are needed
+        correction = empty(temperature_delta.shape, temperature_delta.dtype)
+        for channel, slope in enumerate(self.temperature_slope[:, 0]):
+            multiply(temperature_delta, slope, out=correction)
+            magnetometer[channel] += correction
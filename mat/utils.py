@@ -35,6 +35,13 @@ def epoch(time):
     return (time - datetime(1970, 1, 1)).total_seconds()
 
 
+def posix_time(time):
+    """ Return posix seconds for a datetime. Numbers are returned as is """
+    if isinstance(time, datetime):
+        return epoch(time)
+    return time
+
+
 def epoch_from_timestamp(date_string):
     """ Return posix timestamp """
     epoch_time = datetime(1970, 1, 1)
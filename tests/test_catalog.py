@@ -0,0 +1,93 @@
+import os
+import shutil
+import sqlite3
+from datetime import datetime
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from mat.catalog import catalog_directory, catalog_entry, main, query
+from tests.utils import reference_file
+
+
+class TestCatalog(TestCase):
+    def setUp(self):
+        self.directory = TemporaryDirectory()
+        self.db_path = os.path.join(self.directory.name, 'catalog.db')
+        os.mkdir(os.path.join(self.directory.name, 'sub'))
+        for file_name, destination in [('test.lid', 'test.lid'),
+                                       ('two_page_file.lid',
+                                        'sub/two_page_file.lid'),
+                                       ('mhs_wrong_place.lid', 'bad.lid'),
+                                       ('v3_calibration.txt', 'notes.txt')]:
+            shutil.copy(reference_file(file_name),
+                        os.path.join(self.directory.name, destination))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def path(self, file_name):
+        return os.path.abspath(os.path.join(self.directory.name, file_name))
+
+    def test_entry(self):
+        entry = catalog_entry(self.path('sub/two_page_file.lid'))
+        assert entry['serial'] == '1806047'
+        assert entry['deployment'] == 89
+        assert entry['n_pages'] == 2
+        assert entry['start_time'] == 1535708941
+        assert entry['end_time'] == 1535710291 + 90 * 15
+        assert entry['calibration_version'] == 3
+        assert entry['TMP'] == 1 and entry['PRS'] == 0
+        assert entry['header_error'] is None
+        assert entry['error'] is None
+
+    def test_dissolved_oxygen_sensor(self):
+        with open(self.path('test.lid'), 'rb') as fid:
+            contents = fid.read()
+        with open(self.path('do.lid'), 'wb') as fid:
+            fid.write(contents.replace(b'PHD 0', b'DOS 1', 1))
+        catalog_directory(self.directory.name, workers=1)
+        assert [f['path'] for f in query(self.db_path, sensor='DOS')] == [
+            self.path('do.lid')]
+
+    def test_catalog_with_other_sensors_rebuilt(self):
+        with sqlite3.connect(self.db_path) as connection:
+            connection.execute('CREATE TABLE files (path TEXT PRIMARY KEY, '
+                               'size INTEGER, mtime_ns INTEGER, TMP INTEGER)')
+        connection.close()
+        assert catalog_directory(self.directory.name, workers=1) == 3
+        assert len(query(self.db_path, sensor='DOT')) == 0
+
+    def test_unreadable_file(self):
+        entry = catalog_entry(self.path('bad.lid'))
+        assert entry['error'] == 'MHS tag missing on first data page.'
+
+    def test_catalog_and_query(self):
+        assert catalog_directory(self.directory.name, workers=2) == 3
+        files = query(self.db_path)
+        assert [f['path'] for f in files] == [
+            self.path('sub/two_page_file.lid'), self.path('test.lid')]
+        assert query(self.db_path, sensor='PRS') == []
+        in_august = query(self.db_path,
+                          sensor='MGN',
+                          start=datetime(2018, 8, 1),
+                          end=datetime(2018, 9, 1))
+        assert [f['serial'] for f in in_august] == ['1806047']
+        assert len(query(self.db_path, serial=1805225)) == 1
+
+    def test_unknown_sensor(self):
+        catalog_directory(self.directory.name, workers=1)
+        with self.assertRaises(ValueError):
+            query(self.db_path, sensor='XYZ')
+
+    def test_only_changed_files_read(self):
+        catalog_directory(self.directory.name, workers=1)
+        assert catalog_directory(self.directory.name, workers=1) == 0
+        os.utime(self.path('test.lid'), ns=(0, 0))
+        os.remove(self.path('bad.lid'))
+        assert catalog_directory(self.directory.name, workers=1) == 1
+        assert len(query(self.db_path)) == 2
+
+    def test_command_line(self):
+        db_path = os.path.join(self.directory.name, 'other.db')
+        assert main([self.directory.name, '--db', db_path,
+                     '--workers', '1']) == 3
+        assert len(query(db_path, sensor='TMP')) == 2
@@ -0,0 +1,29 @@
+from unittest import TestCase
+from mat.conversion_cache import ConversionCache
+
+
+class TestConversionCache(TestCase):
+    def test_converted_once_per_page(self):
+        cache = ConversionCache()
+        calls = []
+
+        def convert():
+            calls.append(1)
+            return len(calls)
+
+        assert cache.get(('page', 0), 'a', convert) == 1
+        assert cache.get(('page', 0), 'a', convert) == 1
+        assert cache.get(('page', 0), 'b', convert) == 2
+        assert (cache.hits, cache.misses) == (1, 2)
+
+    def test_new_page_drops_entries(self):
+        cache = ConversionCache()
+        cache.get(('page', 0), 'a', lambda: 1)
+        assert cache.get(('page', 1), 'a', lambda: 2) == 2
+        assert cache.get(('page', 0), 'a', lambda: 3) == 3
+
+    def test_clear(self):
+        cache = ConversionCache()
+        cache.get(('page', 0), 'a', lambda: 1)
+        cache.clear()
+        assert cache.get(('page', 0), 'a', lambda: 2) == 2
@@ -1,6 +1,7 @@
 from unittest import TestCase
-from numpy import array
-from numpy.testing import assert_array_almost_equal
+from numpy import array, vstack, zeros
+from numpy.testing import assert_array_almost_equal, assert_array_equal
+from mat.accel_mag_converter import AccelMagConverter
 from mat.converter import Converter
 from mat.cubic_accelerometer import CubicAccelerometer
 from mat.cubic_magnetometer import CubicMagnetometer
@@ -113,8 +114,42 @@ class TestConverter(TestCase):
                                                          EXAMPLE_TEMP_ARRAY),
                                   TCM_EXPECTATION)
 
+    def test_temp_comp_magnetometer_leaves_temperature_alone(self):
+        converter = Converter(calibration_from_file("v3_temp_comp.txt"))
+        temperature = array([-30.0, 1, 1, 60])
+        magnetometer = converter.magnetometer_converter
+        data = magnetometer.convert(EXAMPLE_RAW_DATA, temperature)
+        assert_array_equal(temperature, [-30, 1, 1, 60])
+        assert_array_almost_equal(data[:, 1:3], TCM_EXPECTATION[:, 1:3])
+        out = zeros(EXAMPLE_RAW_DATA.shape)
+        magnetometer.convert_into(EXAMPLE_RAW_DATA, out, temperature)
+        assert_array_equal(temperature, [-30, 1, 1, 60])
+        assert_array_equal(out, data)
+
     def test_dissolved_oxygen(self):
         data = array([6400, 9847, 39321])
         expected = array([19.00, 26.77, 99.99])
         converter = BinaryCodedDecimal()
         assert_array_almost_equal(converter.convert(data), expected)
+
+    def test_dissolved_oxygen_int16_page(self):
+        # pages are read as int16, so values from 0x8000 up are negative
+        data = array([[0x1900, 0x2677, 0x9999 - 0x10000, 0]], dtype='int16')
+        expected = array([[19.00, 26.77, 99.99, 0]])
+        converter = BinaryCodedDecimal()
+        assert_array_almost_equal(converter.convert(data), expected)
+        assert converter.convert(data[:, :0]).shape == (1, 0)
+
+    def test_accel_mag_converter(self):
+        raw = vstack((EXAMPLE_RAW_DATA, EXAMPLE_RAW_DATA[::-1]))
+        temperature = array([-30.0, 1.0, 20.0, 60.0])
+        for file_name in ['v3_calibration.txt',
+                          'v3_temp_comp.txt',
+                          'v2_linear_acc.txt']:
+            converter = Converter(calibration_from_file(file_name))
+            accel_mag = AccelMagConverter(converter.accelerometer_converter,
+                                          converter.magnetometer_converter)
+            expected = vstack((
+                converter.accelerometer(raw[:3]),
+                converter.magnetometer(raw[3:], temperature.copy())))
+            assert_array_equal(accel_mag.convert(raw, temperature), expected)
@@ -2,6 +2,12 @@
 # Copyright (c) 2018 Lowell Instruments, LLC, some rights reserved
 
 
+import os
+import filecmp
+from datetime import datetime, timedelta
+from tempfile import TemporaryDirectory
+from threading import Thread
+from time import sleep
 from unittest import TestCase
 from mat.data_converter import DataConverter, default_parameters
 from mat.data_file_factory import load_data_file, WrongFileTypeError
@@ -9,6 +15,40 @@ from tests.utils import reference_file, compare_files
 from tests.utils import assert_compare_expected_file
 from mat.tiltcurve import TiltCurve
 from mat.calibration_factories import make_from_calibration_file
+import h5py
+import numpy as np
+
+
+def _csv_values(path):
+    """ The data columns of an output csv file, without the time """
+    with open(path) as csv_file:
+        return np.array([[float(value) for value in line.split(',')[1:]]
+                         for line in csv_file.readlines()[1:]])
+
+
+def _four_page_file(directory, seconds_apart, tags=()):
+    """
+    A file of four copies of the first page of two_page_file.lid,
+    seconds_apart seconds apart, with the (old, new) tags swapped. The
+    header and the pages are cut back to their size.
+    """
+    with open(reference_file('two_page_file.lid'), 'rb') as fid:
+        contents = fid.read()
+    header = contents[:32768]
+    first_page = contents[32768:32768 + 1024 ** 2]
+    for old, new in tags:
+        header = header.replace(old, new)[:32768]
+        first_page = first_page.replace(old, new)[:1024 ** 2]
+    path = os.path.join(directory, 'four_pages.lid')
+    with open(path, 'wb') as fid:
+        fid.write(header)
+        for i in range(4):
+            clock = datetime(2018, 8, 31, 9, 49, 1 + (i > 0)) \
+                + timedelta(seconds=seconds_apart * i)
+            fid.write(first_page.replace(
+                b'CLK 2018-08-31 09:49:01',
+                clock.strftime('CLK %Y-%m-%d %H:%M:%S').encode()))
+    return path
 
 
 class TestDataConverter(TestCase):
@@ -28,6 +68,256 @@ class TestDataConverter(TestCase):
         assert_compare_expected_file('test_AccelMag.csv')
         assert_compare_expected_file('test_Temperature.csv')
 
+    def test_conversion_mmap_backend(self):
+        full_file_path = reference_file('test.lid')
+        parameters = default_parameters()
+        parameters['average'] = False
+        parameters['backend'] = 'mmap'
+        converter = DataConverter(full_file_path, parameters)
+        converter.convert()
+        converter.close_source()
+        assert_compare_expected_file('test_AccelMag.csv')
+        assert_compare_expected_file('test_Temperature.csv')
+
+    def test_conversion_with_prefetch(self):
+        full_file_path = reference_file('test.lid')
+        parameters = default_parameters()
+        parameters['average'] = False
+        parameters['prefetch'] = 2
+        DataConverter(full_file_path, parameters).convert()
+        assert_compare_expected_file('test_AccelMag.csv')
+        assert_compare_expected_file('test_Temperature.csv')
+
+    def test_time_range(self):
+        full_file_path = reference_file('two_page_file.lid')
+        parameters = default_parameters()
+        parameters['time_format'] = 'posix'
+        parameters['time_range'] = (1535710290, 1535710350)
+        DataConverter(full_file_path, parameters).convert()
+        path = reference_file('two_page_file_Temperature.csv')
+        with open(path) as fid:
+            lines = fid.readlines()[1:]
+        os.remove(path)
+        os.remove(reference_file('two_page_file_AccelMag.csv'))
+        times = [float(line.split(',')[0]) for line in lines]
+        assert times == [1535710291.0, 1535710306.0,
+                         1535710321.0, 1535710336.0]
+
+    def test_time_range_hdf5(self):
+        with TemporaryDirectory() as directory:
+            parameters = default_parameters()
+            parameters['output_format'] = 'hdf5'
+            parameters['output_directory'] = directory
+            parameters['time_range'] = (1535710290, 1535710350)
+            DataConverter(reference_file('two_page_file.lid'),
+                          parameters).convert()
+            path = os.path.join(directory, 'two_page_file.hdf5')
+            with h5py.File(path, 'r') as file:
+                times = file['Temperature']['Time'][:].tolist()
+        assert times == [1535710291.0, 1535710306.0,
+                         1535710321.0, 1535710336.0]
+
+    def test_follow_growing_file(self):
+        source = reference_file('two_page_file.lid')
+        with open(source, 'rb') as fid:
+            contents = fid.read()
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'growing.lid')
+            with open(path, 'wb') as fid:
+                fid.write(contents[:600000])
+
+            def download():
+                for end in [1200000, len(contents)]:
+                    sleep(0.3)
+                    with open(path, 'ab') as fid:
+                        fid.write(contents[fid.tell():end])
+
+            writer = Thread(target=download)
+            writer.start()
+            parameters = default_parameters()
+            parameters['follow'] = True
+            parameters['follow_timeout'] = 1
+            parameters['output_directory'] = directory
+            parameters['file_name'] = 'followed'
+            DataConverter(path, parameters).convert()
+            writer.join()
+            parameters['follow'] = False
+            parameters['file_name'] = 'complete'
+            DataConverter(source, parameters).convert()
+            for stream in ['AccelMag', 'Temperature']:
+                assert filecmp.cmp(
+                    os.path.join(directory, 'followed_' + stream + '.csv'),
+                    os.path.join(directory, 'complete_' + stream + '.csv'),
+                    shallow=False)
+
+    def test_follow_with_time_range(self):
+        source = reference_file('two_page_file.lid')
+        with TemporaryDirectory() as directory:
+            parameters = default_parameters()
+            parameters['time_range'] = (1535710290, 1535710350)
+            parameters['output_directory'] = directory
+            parameters['follow'] = True
+            parameters['follow_timeout'] = 0
+            parameters['file_name'] = 'followed'
+            DataConverter(source, parameters).convert()
+            parameters['follow'] = False
+            parameters['file_name'] = 'complete'
+            DataConverter(source, parameters).convert()
+            for stream in ['AccelMag', 'Temperature']:
+                assert filecmp.cmp(
+                    os.path.join(directory, 'followed_' + stream + '.csv'),
+                    os.path.join(directory, 'complete_' + stream + '.csv'),
+                    shallow=False)
+
+    def test_follow_converts_full_last_page(self):
+        with open(reference_file('two_page_file.lid'), 'rb') as fid:
+            contents = fid.read()
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'one_page.lid')
+            with open(path, 'wb') as fid:
+                fid.write(contents[:32768 + 1024 ** 2])
+            converter = DataConverter(path, default_parameters())
+            converter._load_source_file()
+            assert converter._complete_pages(1) == 1
+            converter.close_source()
+        converter = DataConverter(reference_file('two_page_file.lid'),
+                                  default_parameters())
+        converter._load_source_file()
+        assert converter._complete_pages(2) == 1
+        converter.close_source()
+
+    def test_follow_rejects_batches_and_prefetch(self):
+        for name, value in [('batch_pages', 4), ('prefetch', 2)]:
+            parameters = default_parameters()
+            parameters['follow'] = True
+            parameters[name] = value
+            with self.assertRaises(ValueError):
+                DataConverter(reference_file('test.lid'), parameters)
+
+    def test_batch_pages(self):
+        with TemporaryDirectory() as directory:
+            path = _four_page_file(directory, 1350)
+            parameters = default_parameters()
+            parameters['output_directory'] = directory
+            for output_type in ['discrete', 'current']:
+                parameters['output_type'] = output_type
+                parameters['tilt_curve'] = TiltCurve(
+                    reference_file('tiltcurve/TCM-1, 1BalSalt.cal'))
+                for batch_pages in [1, 3]:
+                    parameters['batch_pages'] = batch_pages
+                    parameters['file_name'] = '{}_{}'.format(output_type,
+                                                             batch_pages)
+                    DataConverter(path, parameters).convert()
+            for name in ['discrete_{}_AccelMag.csv',
+                         'discrete_{}_Temperature.csv',
+                         'current_{}_Current.csv']:
+                assert filecmp.cmp(os.path.join(directory, name.format(1)),
+                                   os.path.join(directory, name.format(3)),
+                                   shallow=False)
+
+    def test_batch_pages_dissolved_oxygen(self):
+        # the longer mini header makes the pages end in the middle of a
+        # record, so they don't hold as many samples of each sensor
+        tags = [(b'TMP 1', b'DOS 1'), (b'ACL 1', b'DOP 1'),
+                (b'MGN 1', b'DOT 1'), (b'BAT 0f9e', b'BAT 0f9e00')]
+        with TemporaryDirectory() as directory:
+            path = _four_page_file(directory, 200000, tags)
+            parameters = default_parameters()
+            parameters['output_directory'] = directory
+            for batch_pages in [1, 4]:
+                parameters['batch_pages'] = batch_pages
+                parameters['file_name'] = str(batch_pages)
+                DataConverter(path, parameters).convert()
+            assert filecmp.cmp(
+                os.path.join(directory, '1_DissolvedOxygen.csv'),
+                os.path.join(directory, '4_DissolvedOxygen.csv'),
+                shallow=False)
+
+    def test_conversion_from_buffer(self):
+        full_file_path = reference_file('test.lid')
+        with open(full_file_path, 'rb') as fid:
+            contents = fid.read()
+        parameters = default_parameters()
+        parameters['average'] = False
+        DataConverter(full_file_path, parameters, contents).convert()
+        assert_compare_expected_file('test_AccelMag.csv')
+        assert_compare_expected_file('test_Temperature.csv')
+
+    def test_sensors_converted_once_per_page(self):
+        with TemporaryDirectory() as directory:
+            parameters = default_parameters()
+            parameters['output_directory'] = directory
+            converter = DataConverter(reference_file('test.lid'), parameters)
+            converter.convert()
+            converter.close_source()
+        # Temperature is used by the magnetometer and its own output. The
+        # accelerometer and magnetometer are converted together.
+        cache = converter.conversion_cache
+        assert (cache.hits, cache.misses) == (1, 2)
+
+    def test_sensor_selection(self):
+        with TemporaryDirectory() as directory:
+            parameters = default_parameters()
+            parameters['output_directory'] = directory
+            DataConverter(reference_file('test.lid'), parameters).convert()
+            os.mkdir(os.path.join(directory, 'selected'))
+            parameters['output_directory'] = os.path.join(directory,
+                                                          'selected')
+            parameters['sensors'] = ['Temperature', 'Magnetometer',
+                                     'Pressure']
+            DataConverter(reference_file('test.lid'), parameters).convert()
+            assert sorted(os.listdir(parameters['output_directory'])) == [
+                'test_Magnetometer.csv', 'test_Temperature.csv']
+            assert filecmp.cmp(
+                os.path.join(directory, 'test_Temperature.csv'),
+                os.path.join(directory, 'selected', 'test_Temperature.csv'),
+                shallow=False)
+
+    def test_unknown_sensor_selection(self):
+        parameters = default_parameters()
+        parameters['sensors'] = ['Temperature', 'Salinity']
+        converter = DataConverter(reference_file('test.lid'), parameters)
+        with self.assertRaises(ValueError):
+            converter.convert()
+        converter.close_source()
+
+    def test_lookup_tables(self):
+        with TemporaryDirectory() as directory:
+            parameters = default_parameters()
+            parameters['output_directory'] = directory
+            parameters['average'] = False
+            DataConverter(reference_file('test.lid'), parameters).convert()
+            os.rename(os.path.join(directory, 'test_Temperature.csv'),
+                      os.path.join(directory, 'expected.csv'))
+            parameters['lookup_tables'] = True
+            DataConverter(reference_file('test.lid'), parameters).convert()
+            assert filecmp.cmp(os.path.join(directory, 'expected.csv'),
+                               os.path.join(directory, 'test_Temperature.csv'),
+                               shallow=False)
+
+    def test_single_precision(self):
+        parameters = default_parameters()
+        parameters['average'] = False
+        parameters['dtype'] = 'float32'
+        DataConverter(reference_file('test.lid'), parameters).convert()
+        # within one unit of the last printed digit of the reference
+        for file_name, last_digit in [
+                ('test_AccelMag.csv', [1e-4] * 3 + [1e-2] * 3),
+                ('test_Temperature.csv', [1e-4])]:
+            new, expected = [_csv_values(reference_file(name))
+                             for name in [file_name, file_name + '.expect']]
+            os.remove(reference_file(file_name))
+            assert new.shape == expected.shape
+            assert np.all(np.abs(new - expected)
+                          <= np.multiply(last_digit, 1.01))
+
+    def test_unknown_dtype(self):
+        parameters = default_parameters()
+        for dtype in ['float16', 'int16']:
+            parameters['dtype'] = dtype
+            with self.assertRaises(ValueError):
+                DataConverter(reference_file('test.lid'), parameters)
+
     def test_data_converter_creation(self):
         full_file_path = reference_file("test.lid")
         parameters = default_parameters()
@@ -0,0 +1,46 @@
+import os
+import shutil
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from numpy.testing import assert_array_equal
+from mat.data_file_factory import load_data_file
+from mat.index_cache import index_path, load_index
+from mat.v3_calibration import V3Calibration
+from tests.utils import reference_file
+
+
+class TestIndexCache(TestCase):
+    def setUp(self):
+        self.directory = TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'two_page_file.lid')
+        shutil.copy(reference_file('two_page_file.lid'), self.path)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_cache_not_written_by_default(self):
+        load_data_file(self.path).close()
+        assert not os.path.exists(index_path(self.path))
+
+    def test_cache_written(self):
+        load_data_file(self.path, index_cache=True).close()
+        assert load_index(self.path)['n_pages'] == 2
+
+    def test_restored_values_match(self):
+        expected = load_data_file(self.path)
+        load_data_file(self.path, index_cache=True).close()
+        cached = load_data_file(self.path, index_cache=True)
+        assert cached.n_pages() == expected.n_pages()
+        assert_array_equal(cached.page_times(), expected.page_times())
+        assert cached.mini_header_length() == expected.mini_header_length()
+        assert cached.header().tags() == expected.header().tags()
+        assert type(cached.calibration()) == V3Calibration
+        assert (cached.calibration().coefficients
+                == expected.calibration().coefficients)
+        assert (cached.page(1) == expected.page(1)).all()
+
+    def test_modified_file_invalidates_cache(self):
+        load_data_file(self.path, index_cache=True).close()
+        with open(self.path, 'ab') as fid:
+            fid.write(b'\x00' * 10)
+        assert load_index(self.path) is None
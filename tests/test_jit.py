@@ -0,0 +1,123 @@
+import subprocess
+import sys
+from unittest import TestCase, skipUnless
+from unittest.mock import patch
+import numpy as np
+from numpy.testing import assert_allclose, assert_array_equal
+from mat import jit
+from mat.converter import Converter
+from mat.data_converter import DataConverter, default_parameters
+from mat.header import Header
+from mat.sensor import create_sensors, use_dtype, use_jit
+from mat.temperature import Temperature
+from mat.utils import roll_pitch_yaw
+from tests.utils import (
+    assert_compare_expected_file,
+    calibration_from_file,
+    reference_file,
+)
+
+
+RAW = np.array([[-1200, 3, 17, 512, -9000, 1024],
+                [400, -513, 80, 12000, 9, -2],
+                [15000, 900, -30000, 7, 64, 1]], dtype='<i2')
+
+
+@skipUnless(jit.available(), 'numba is not installed')
+class TestJit(TestCase):
+    def test_temperature(self):
+        converter = Temperature(calibration_from_file('v3_calibration.txt'))
+        raw = np.reshape(np.arange(0, 2 ** 16, 7, dtype=np.uint16), (1, -1))
+        with np.errstate(all='ignore'):
+            expected = converter.convert(raw)
+        compiled = jit.compiled_converter(converter)
+        assert_allclose(compiled.convert(raw), expected, rtol=1e-12)
+        assert compiled.convert(np.array([[65535]])) == expected[0, 0]
+
+    def test_meters(self):
+        for calibration_file in ['v3_calibration.txt', 'v3_temp_comp.txt']:
+            converter = Converter(calibration_from_file(calibration_file))
+            temperature = np.array([-40, 0, 10, 20, 30, 60.])
+            for meter in [converter.accelerometer_converter,
+                          converter.magnetometer_converter]:
+                compiled = jit.compiled_converter(meter)
+                assert compiled is not meter
+                assert_allclose(compiled.convert(RAW, temperature),
+                                meter.convert(RAW, temperature),
+                                rtol=1e-12)
+
+    def test_roll_pitch_yaw(self):
+        accel = np.array([[0.1, -0.5, 0.9], [0.2, 0.7, -0.1], [1, 0.5, 0]])
+        mag = np.array([[30., -4, 12], [-8, 15, 2], [40, 3, -22]])
+        for compiled, expected in zip(jit.roll_pitch_yaw(accel, mag),
+                                      roll_pitch_yaw(accel, mag)):
+            assert_allclose(compiled, expected, rtol=1e-12)
+
+    def test_gather_and_average(self):
+        sensors = create_sensors(Header.from_tags('', dict(
+            TMP=True, PRS=True, ACL=True, MGN=True, TRI=7, ORI=3, BMR=4,
+            BMN=2, PRR=2, PRN=2)), None, 60)
+        block = np.reshape(np.arange(2000, dtype='<i2'), (2, -1))
+        expected = [s._parse_block(block)[0] for s in sensors]
+        use_jit(sensors)
+        for sensor, data in zip(sensors, expected):
+            assert_array_equal(sensor._parse_block(block)[0], data)
+            data = data.astype(float)
+            time = np.arange(data.shape[1])
+            sensor.jit = False
+            numpy_average = sensor._average_bursts(data, time)
+            sensor.jit = True
+            compiled_average = sensor._average_bursts(data, time)
+            assert_allclose(compiled_average[0], numpy_average[0])
+            assert_array_equal(compiled_average[1], numpy_average[1])
+
+    def test_single_precision(self):
+        sensors = create_sensors(Header.from_tags('', dict(
+            TMP=True, ACL=True, MGN=True, TRI=10, ORI=10, BMR=2, BMN=2)),
+            calibration_from_file('v3_temp_comp.txt'),
+            60)
+        raw_temperature = np.array([[12000, 20000, 41000]])
+        temperature = np.array([-40, 0, 10, 20, 30, 60.])
+        use_jit(sensors)
+        expected = [sensors[0].converter.convert(raw_temperature)]
+        expected += [s.converter.convert(RAW, temperature)
+                     for s in sensors[1:]]
+        use_dtype(sensors, 'float32')
+        raw = RAW.astype(np.float32)
+        temperature = temperature.astype(np.float32)
+        converted = [sensors[0].converter.convert(
+            raw_temperature.astype(np.float32))]
+        converted += [s.converter.convert(raw, temperature)
+                      for s in sensors[1:]]
+        for data, expected_data in zip(converted, expected):
+            assert data.dtype == np.float32
+            assert_allclose(data, expected_data, rtol=1e-5, atol=1e-4)
+        data = converted[1]
+        assert jit.average_bursts(data, 2).dtype == np.float32
+        assert all(angle.dtype == np.float32
+                   for angle in jit.roll_pitch_yaw(data, converted[2]))
+
+    def test_conversion(self):
+        parameters = default_parameters()
+        parameters['average'] = False
+        parameters['jit'] = True
+        DataConverter(reference_file('test.lid'), parameters).convert()
+        assert_compare_expected_file('test_AccelMag.csv')
+        assert_compare_expected_file('test_Temperature.csv')
+
+
+class TestWithoutJit(TestCase):
+    def test_numba_not_imported(self):
+        code = ('import sys, mat.data_converter; '
+                'assert "numba" not in sys.modules')
+        subprocess.run([sys.executable, '-c', code], check=True)
+
+    def test_sensors_unchanged(self):
+        sensors = create_sensors(Header.from_tags('', dict(TMP=True, TRI=10)),
+                                 calibration_from_file('v3_calibration.txt'),
+                                 60)
+        converter = sensors[0].converter
+        with patch('mat.jit.available', return_value=False):
+            use_jit(sensors)
+        assert sensors[0].jit is False
+        assert sensors[0].converter is converter
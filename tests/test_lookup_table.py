@@ -0,0 +1,35 @@
+from unittest import TestCase
+import numpy as np
+from numpy.testing import assert_array_equal
+from mat.binary_coded_decimal import BinaryCodedDecimal
+from mat.data_file_factory import load_data_file
+from mat.light import Light
+from mat.lookup_table import LookupTable
+from mat.pressure import Pressure
+from mat.temperature import Temperature
+from tests.utils import reference_file
+
+
+class TestLookupTable(TestCase):
+    def test_matches_formulas(self):
+        calibration = load_data_file(reference_file('test.lid')).calibration()
+        all_counts = np.arange(2 ** 16, dtype=np.uint16)
+        for converter, data_type in [(Temperature, 'uint16'),
+                                     (Pressure, 'uint16'),
+                                     (Light, 'uint16'),
+                                     (BinaryCodedDecimal, 'int16')]:
+            converter = converter(calibration)
+            raw = np.reshape(all_counts.view(data_type), (1, -1))
+            lookup_table = LookupTable(converter, data_type)
+            with np.errstate(all='ignore'):
+                expected = converter.convert(raw)
+            assert_array_equal(lookup_table.convert(raw), expected)
+            assert_array_equal(lookup_table.convert(raw[:, 5::7]),
+                               expected[:, 5::7])
+
+    def test_other_data_types_use_converter(self):
+        calibration = load_data_file(reference_file('test.lid')).calibration()
+        converter = Pressure(calibration)
+        raw = np.array([[0.5, 1000.25]])
+        assert_array_equal(LookupTable(converter, 'uint16').convert(raw),
+                           converter.convert(raw))
@@ -0,0 +1,40 @@
+from unittest import TestCase
+import numpy as np
+from mat.page_cache import PageCache
+
+
+def _load(key):
+    return np.zeros(50, dtype='<i2')  # 100 bytes
+
+
+class TestPageCache(TestCase):
+    def test_hits_and_misses(self):
+        cache = PageCache(1000)
+        cache.get(0, _load)
+        cache.get(0, _load)
+        cache.get(1, _load)
+        info = cache.info()
+        assert (info.hits, info.misses, info.pages) == (1, 2, 2)
+        assert info.bytes == 200
+
+    def test_evicts_least_recently_used(self):
+        cache = PageCache(250)
+        cache.get(0, _load)
+        cache.get(1, _load)
+        cache.get(0, _load)
+        cache.get(2, _load)
+        cache.get(0, _load)
+        assert cache.info().hits == 2
+        cache.get(1, _load)
+        assert cache.info().misses == 4
+
+    def test_page_larger_than_budget_is_not_cached(self):
+        cache = PageCache(10)
+        cache.get(0, _load)
+        assert cache.info().pages == 0
+
+    def test_discard(self):
+        cache = PageCache(1000)
+        cache.get(0, _load)
+        cache.discard(0)
+        assert cache.info().bytes == 0
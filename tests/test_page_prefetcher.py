@@ -0,0 +1,24 @@
+from unittest import TestCase
+from numpy.testing import assert_array_equal
+from mat.data_file_factory import load_data_file
+from mat.page_prefetcher import PagePrefetcher
+from tests.utils import reference_file
+
+
+class TestPagePrefetcher(TestCase):
+    def test_pages_in_order(self):
+        data_file = load_data_file(reference_file('two_page_file.lid'))
+        pages = list(PagePrefetcher(data_file.page, range(2), 1))
+        assert [i for i, _ in pages] == [0, 1]
+        assert_array_equal(pages[1][1], data_file.page(1))
+
+    def test_error_is_raised_in_consumer(self):
+        data_file = load_data_file(reference_file('test.lid'))
+        with self.assertRaises(ValueError):
+            list(PagePrefetcher(data_file.page, range(3), 2))
+
+    def test_stop_early(self):
+        data_file = load_data_file(reference_file('two_page_file.lid'))
+        for i, page in PagePrefetcher(data_file.page, range(2), 1):
+            break
+        assert i == 0
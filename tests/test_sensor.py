@@ -0,0 +1,225 @@
+from heapq import merge
+from unittest import TestCase
+import numpy as np
+from numpy.testing import assert_allclose, assert_array_equal
+from mat.data_file_factory import load_data_file
+from mat.header import Header
+from mat.sensor import (
+    _temperature_at,
+    accel_mag_pair,
+    bytes_per_interval,
+    create_sensors,
+    major_interval_info,
+    use_dtype,
+)
+from tests.utils import reference_file
+
+
+def header(**tags):
+    return Header.from_tags('', tags)
+
+
+class TestSensor(TestCase):
+    def test_sample_ind_interleaved(self):
+        # temperature every 2 s, 2 bursts of 3-channel accelerometer and
+        # magnetometer samples every second
+        sensors = create_sensors(header(TMP=True, ACL=True, MGN=True,
+                                        TRI=2, ORI=1, BMR=2, BMN=2),
+                                 None,
+                                 2)
+        sample_ind = {s.name: s.sample_ind.tolist() for s in sensors}
+        assert sample_ind == {
+            'Temperature': [0],
+            'Accelerometer': [1, 2, 3, 7, 8, 9, 13, 14, 15, 19, 20, 21],
+            'Magnetometer': [4, 5, 6, 10, 11, 12, 16, 17, 18, 22, 23, 24]}
+
+    def test_sample_ind_matches_sorted_times(self):
+        sensors = create_sensors(header(TMP=True, PRS=True, ACL=True,
+                                        MGN=True, TRI=7, ORI=3, BMR=4,
+                                        BMN=2, PRR=2, PRN=1),
+                                 None,
+                                 60)
+        samples = sorted((t, s.order, i)
+                         for s in sensors
+                         for i, t in enumerate(s.full_sample_times()))
+        for sensor in sensors:
+            expected = [i for i, sample in enumerate(samples)
+                        if sample[1] == sensor.order]
+            assert_array_equal(sensor.sample_ind, expected)
+
+    def test_overrunning_burst_keeps_its_order(self):
+        # 64 samples at 8 Hz take 8 s, longer than the 7 s interval
+        pressure, = create_sensors(header(PRS=True, TRI=7, PRR=8, PRN=64),
+                                   None,
+                                   60)
+        assert_array_equal(pressure.sample_ind,
+                           np.arange(len(pressure.sample_ind)))
+
+    def test_overrunning_burst_merged_as_generated(self):
+        sensors = create_sensors(header(TMP=True, PRS=True, TRI=7, PRR=8,
+                                        PRN=64),
+                                 None,
+                                 60)
+        samples = list(merge(*[[(t, s.order) for t in s.full_sample_times()]
+                               for s in sensors]))
+        for sensor in sensors:
+            expected = [i for i, sample in enumerate(samples)
+                        if sample[1] == sensor.order]
+            assert_array_equal(sensor.sample_ind, expected)
+
+    def test_no_sensors(self):
+        assert create_sensors(header(TMP=False), None, 10) == []
+
+    def test_sample_index_is_periodic(self):
+        # the sequence repeats every 21 s, with 18 s left over
+        sensors = create_sensors(header(TMP=True, ACL=True, TRI=7, ORI=3,
+                                        BMR=4, BMN=2),
+                                 None,
+                                 60)
+        temperature, accelerometer = sensors
+        assert temperature.sample_index.record_length == 45
+        assert temperature.sample_index.n_records == 2
+        assert temperature.sample_index.offsets.tolist() == [0, 19, 32]
+        assert temperature.sample_index.tail_offsets.tolist() == [0, 19, 32]
+        assert len(accelerometer.sample_index) == 20 * 2 * 3
+
+    def test_parse_page_matches_sample_ind(self):
+        sensors = create_sensors(header(TMP=True, PRS=True, ACL=True,
+                                        MGN=True, TRI=7, ORI=3, BMR=4,
+                                        BMN=2, PRR=2, PRN=2),
+                                 None,
+                                 60)
+        n_values = sum(len(s.sample_index) for s in sensors)
+        for length in [n_values, n_values - 50, 100]:
+            page = np.arange(length, dtype='<i2')
+            for sensor in sensors:
+                sample_ind = sensor.sample_ind[sensor.sample_ind < length]
+                samples_per_burst = sensor.burst_count * sensor.channels
+                sample_ind = sample_ind[:len(sample_ind) // samples_per_burst
+                                        * samples_per_burst]
+                expected = np.reshape(page[sample_ind],
+                                      (sensor.channels, -1),
+                                      order='F')
+                data, time = sensor._parse_page(page)
+                assert_array_equal(data, expected)
+                assert len(time) == data.shape[1]
+                block, _ = sensor._parse_block(np.stack((page, page)))
+                assert_array_equal(block, np.tile(expected, 2))
+
+    def test_layout_shared_by_same_configuration(self):
+        tags = dict(TMP=True, ACL=True, MGN=True, TRI=10, ORI=10, BMR=8,
+                    BMN=8)
+        first = create_sensors(header(**tags), None, 600)
+        second = create_sensors(header(SER='other', **tags), None, 600)
+        assert all(a.sample_index is b.sample_index
+                   for a, b in zip(first, second))
+        assert first[0] is not second[0]
+        other_seconds = create_sensors(header(**tags), None, 300)
+        assert other_seconds[0].sample_index is not first[0].sample_index
+        with self.assertRaises(ValueError):
+            first[0].sample_index.offsets[0] = 1
+
+    def test_major_interval_info(self):
+        tags = header(TMP=True, ACL=True, MGN=True, TRI=10, ORI=10, BMR=8,
+                      BMN=8, PRR=4, PRN=4)
+        assert major_interval_info(tags) == (10, 98)
+
+    def test_bytes_per_interval_matches_sensors(self):
+        tags = header(TMP=True, PRS=True, ACL=True, MGN=True, TRI=7, ORI=3,
+                      BMR=4, BMN=2, PRR=2, PRN=2)
+        for seconds in [7, 21, 60]:
+            sensors = create_sensors(tags, None, seconds)
+            assert bytes_per_interval(tags, seconds) == sum(
+                s.samples_per_page() * 2 for s in sensors)
+
+    def test_full_sample_times(self):
+        accelerometer = create_sensors(header(ACL=True, ORI=2, BMR=4, BMN=2),
+                                       None,
+                                       4)[0]
+        times = accelerometer.full_sample_times()
+        assert times.dtype == np.float64
+        assert_array_equal(times, [0, 0, 0, 0.25, 0.25, 0.25,
+                                   2, 2, 2, 2.25, 2.25, 2.25])
+
+    def test_accel_mag_pair_sample_index(self):
+        sensors = create_sensors(header(TMP=True, PRS=True, ACL=True,
+                                        MGN=True, TRI=7, ORI=3, BMR=4,
+                                        BMN=2, PRR=2, PRN=2),
+                                 None,
+                                 60)
+        for sensor in sensors:
+            sensor.converter = None
+        pair = accel_mag_pair(sensors)
+        accelerometer, magnetometer = sensors[2:]
+        assert pair.channels == 6
+        assert_array_equal(pair.sample_ind,
+                           np.sort(np.concatenate((accelerometer.sample_ind,
+                                                   magnetometer.sample_ind))))
+
+    def test_accel_mag_pair_follows_accelerometer(self):
+        sensors = create_sensors(header(TMP=True, ACL=True, MGN=True,
+                                        TRI=10, ORI=10, BMR=2, BMN=2),
+                                 None,
+                                 60)
+        for sensor in sensors:
+            sensor.converter = None
+        pair = accel_mag_pair(sensors)
+        accelerometer = sensors[1]
+        assert pair.sensor_spec is accelerometer.sensor_spec
+        assert pair.conversion_cache is accelerometer.conversion_cache
+        assert pair.temperature is sensors[0]
+        with self.assertRaises(AttributeError):
+            pair.interval
+
+    def test_accel_mag_pair_converts_like_sensors(self):
+        data_file = load_data_file(reference_file('two_page_file.lid'))
+        sensors = create_sensors(data_file.header(),
+                                 data_file.calibration(),
+                                 data_file.seconds_per_page())
+        page = data_file.page(0)
+        accelerometer, magnetometer = sensors[1:]
+        pair = accel_mag_pair(sensors)
+        for average in [False, True]:
+            accel, time = accelerometer.convert(page, average, 10)
+            mag, _ = magnetometer.convert(page, average, 10)
+            data, pair_time = pair.convert(page, average, 10)
+            assert_allclose(data, np.vstack((accel, mag)), rtol=1e-12)
+            assert_array_equal(pair_time, time)
+        use_dtype(sensors, 'float32')
+        pair = accel_mag_pair(sensors)
+        data, _ = pair.convert_block(page[np.newaxis, :],
+                                     True,
+                                     np.array([10.]))
+        assert data.dtype == np.float32
+        data_file.close()
+
+    def test_no_accel_mag_pair_without_both(self):
+        sensors = create_sensors(header(TMP=True, ACL=True, TRI=10, ORI=10),
+                                 None,
+                                 60)
+        assert accel_mag_pair(sensors) is None
+
+    def test_temperature_at_same_times_not_interpolated(self):
+        time = np.array([0., 10., 20.])
+        temp = np.array([1., 2., 3.])
+        assert _temperature_at(time, time.copy(), temp) is temp
+        assert_array_equal(_temperature_at(time + 5, time, temp),
+                           [1.5, 2.5, 3])
+
+    def test_use_dtype(self):
+        data_file = load_data_file(reference_file('two_page_file.lid'))
+        sensors = create_sensors(data_file.header(),
+                                 data_file.calibration(),
+                                 data_file.seconds_per_page())
+        page = data_file.page(0)
+        expected = [s.convert(page, False, 0) for s in sensors]
+        with self.assertRaises(ValueError):
+            use_dtype(sensors, 'int16')
+        use_dtype(sensors, 'float32')
+        sensors[0].conversion_cache.clear()
+        for sensor, (expected_data, expected_time) in zip(sensors, expected):
+            data, time = sensor.convert(page, False, 0)
+            assert data.dtype == np.float32
+            assert_allclose(data, expected_data, rtol=1e-6, atol=1e-4)
+            assert_array_equal(time, expected_time)
+        data_file.close()
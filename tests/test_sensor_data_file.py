@@ -1,4 +1,9 @@
+import os
+from tempfile import TemporaryDirectory
+from io import BytesIO
 from unittest import TestCase
+from datetime import datetime
+from numpy.testing import assert_array_equal
 from mat.data_file_factory import load_data_file, WrongFileTypeError
 from mat.lid_data_file import LidDataFile
 from tests.utils import reference_file
@@ -54,3 +59,136 @@ class TestSensorDataFile(TestCase):
     def test_no_data_in_lid_file(self):
         with self.assertRaises(NoDataError):
             load_data_file(reference_file('No_Channels_Enabled.lid'))
+
+    def test_mmap_pages_match_file_pages(self):
+        path = reference_file('two_page_file.lid')
+        file_backend = load_data_file(path)
+        mmap_backend = load_data_file(path, backend='mmap')
+        for i in range(file_backend.n_pages()):
+            assert_array_equal(mmap_backend.page(i), file_backend.page(i))
+        mmap_backend.close()
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            load_data_file(reference_file('test.lid'), backend='xyz')
+
+    def test_page_index(self):
+        data_file = load_data_file(reference_file('two_page_file.lid'))
+        index = data_file.page_index()
+        assert list(index.offsets) == [32768, 32768 + 1024 ** 2]
+        assert list(index.mini_header_lengths) == [147, 147]
+        assert index.clocks == ['2018-08-31 09:49:01', '2018-08-31 10:11:32']
+        assert_array_equal(data_file.page_times(), [1535708941, 1535710291])
+
+    def test_seconds_per_page(self):
+        data_file = load_data_file(reference_file('two_page_file.lid'))
+        assert data_file.seconds_per_page() == 1350
+
+    def test_page_cache(self):
+        data_file = load_data_file(reference_file('two_page_file.lid'))
+        data_file.page(0)
+        data_file.page(1)
+        data_file.page(0)
+        info = data_file.page_cache_info()
+        assert (info.hits, info.misses) == (1, 2)
+
+    def test_page_cache_budget(self):
+        data_file = load_data_file(reference_file('two_page_file.lid'),
+                                   page_cache_bytes=1024 ** 2)
+        data_file.page(0)
+        data_file.page(1)
+        data_file.page(0)
+        assert data_file.page_cache_info().misses == 3
+
+    def test_pages_between(self):
+        data_file = load_data_file(reference_file('two_page_file.lid'))
+        assert data_file.pages_between(0, 1535708941) == range(0, 0)
+        assert data_file.pages_between(0, 1535708942) == range(0, 1)
+        assert data_file.pages_between(1535709000, 1535710291) == range(0, 1)
+        assert data_file.pages_between(1535709000, 1535710292) == range(0, 2)
+        assert data_file.pages_between(1535710300, 2e9) == range(1, 2)
+        assert data_file.pages_between(0, 1) == range(0, 0)
+        assert data_file.pages_between(datetime(2018, 8, 31, 10, 15),
+                                       datetime(2018, 9, 1)) == range(1, 2)
+
+    def test_refresh_growing_file(self):
+        with open(reference_file('two_page_file.lid'), 'rb') as fid:
+            contents = fid.read()
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'growing.lid')
+            with open(path, 'wb') as fid:
+                fid.write(contents[:32768 + 1024 ** 2 + 100])
+            data_file = load_data_file(path)
+            assert data_file.n_pages() == 1
+            assert data_file.header_error == (1, 2)
+            with open(path, 'ab') as fid:
+                fid.write(contents[32768 + 1024 ** 2 + 100:])
+            assert data_file.refresh() == 2
+            assert data_file.header_error is None
+            assert len(data_file.page_times()) == 2
+            assert len(data_file.page(1)) == (len(contents) - 32768
+                                              - 1024 ** 2 - 147) // 2
+            data_file.close()
+
+    def test_pages_block(self):
+        for backend in ['file', 'mmap']:
+            data_file = load_data_file(reference_file('two_page_file.lid'),
+                                       backend=backend)
+            block = data_file.pages(0, 1)
+            assert block.shape == (1, data_file.page_lengths()[0])
+            assert_array_equal(block[0], data_file.page(0))
+            data_file.close()
+
+    def test_pages_different_lengths(self):
+        data_file = load_data_file(reference_file('two_page_file.lid'))
+        with self.assertRaises(ValueError):
+            data_file.pages(0, 2)
+
+    def test_load_from_buffer(self):
+        path = reference_file('two_page_file.lid')
+        expected = load_data_file(path)
+        with open(path, 'rb') as fid:
+            contents = fid.read()
+        for buffer in [contents,
+                       bytearray(contents),
+                       memoryview(contents),
+                       BytesIO(contents)]:
+            data_file = load_data_file(buffer, file_type='.lid')
+            assert data_file.n_pages() == 2
+            assert_array_equal(data_file.page_times(), expected.page_times())
+            assert_array_equal(data_file.page(1), expected.page(1))
+            assert_array_equal(data_file.pages(0, 1)[0], expected.page(0))
+            data_file.close()
+
+    def test_close_releases_buffer(self):
+        with open(reference_file('two_page_file.lid'), 'rb') as fid:
+            buffer = BytesIO(fid.read())
+        data_file = load_data_file(buffer, file_type='.lid')
+        data_file.page(1)
+        data_file.close()
+        buffer.write(b'MHS')
+        buffer.close()
+
+    def test_buffer_without_file_type(self):
+        with self.assertRaises(WrongFileTypeError):
+            load_data_file(b'')
+
+    def test_recover_pages_after_damage(self):
+        with open(reference_file('two_page_file.lid'), 'rb') as fid:
+            contents = fid.read()
+        header = contents[:32768]
+        first_page = contents[32768:32768 + 1024 ** 2]
+        last_page = contents[32768 + 1024 ** 2:]
+        damaged_page = b'\x00' * 1024 ** 2
+        damaged = (header + first_page + damaged_page + first_page
+                   + b'\xff' * 37 + last_page)
+        data_file = load_data_file(damaged, file_type='.lid')
+        assert data_file.n_pages() == 3
+        assert data_file.header_error == (1, 4)
+        assert data_file.page_index().offsets.tolist() == [
+            32768, 32768 + 2 * 1024 ** 2, 32768 + 3 * 1024 ** 2 + 37]
+        expected = load_data_file(reference_file('two_page_file.lid'))
+        assert_array_equal(data_file.page(1), expected.page(0))
+        assert_array_equal(data_file.page(2), expected.page(1))
+        assert_array_equal(data_file.page_times()[1:],
+                           expected.page_times() - [1, 0])